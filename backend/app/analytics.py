@@ -0,0 +1,198 @@
+"""
+Booking analytics served from daily rollups.
+RoomDailyStats holds one row per room and calendar day with the nights sold
+(non-cancelled bookings staying that night), the revenue of those nights (each
+booking's total_price spread over its nights in proportion to their nightly
+rates) and the cancellations and refunds issued that day. Booking writes feed
+it through a Rollup in their own transaction: +1 when a stay is booked, -1 when
+it is moved away or cancelled. A cancellation only takes back the nights from
+its own day on; nights already stayed stay sold. Deltas are applied as INSERT ... ON CONFLICT DO
+UPDATE increments (UPDATE, then INSERT for missing rows, on databases without
+upserts), so concurrent bookings cannot lose updates and reports never scan
+bookings.
+
+Occupancy is nights sold over room-nights (rooms in scope x days); ADR is
+revenue over nights sold. Reports cover rooms that are not deleted.
+rebuild_analytics.py recomputes the table from the bookings.
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models, pricing, database
+
+MAX_DAYS = 366
+COUNTERS = ("nights_sold", "revenue", "cancellations", "refunds")
+
+def night_revenue(booking) -> List[Tuple[date, float]]:
+    """(night, revenue) of every night of a booking; works on Booking objects and rows"""
+    nights = pricing.stay_nights(booking.start_date.date(), booking.end_date.date())
+    if not nights:
+        return []
+    rates = booking.nightly_rates
+    if not rates or len(rates) != len(nights) or sum(rates) <= 0:
+        rates = [1.0] * len(nights)  # booked before nightly rates were stored
+    subtotal = sum(rates)
+    return [(night, booking.total_price * rate / subtotal) for night, rate in zip(nights, rates)]
+
+class Rollup:
+    """Signed deltas for many rooms and days, written by flush() in one batched upsert"""
+
+    def __init__(self):
+        self.deltas: Dict[Tuple[int, date], List] = defaultdict(lambda: [0, 0.0, 0, 0.0])
+
+    def stay(self, booking, sign: int = 1, since: Optional[date] = None, until: Optional[date] = None):
+        """Count (+1) or uncount (-1) the nights and revenue of a booking,
+        optionally only its nights in [since, until)"""
+        if booking.room_id is None:
+            return
+        for night, revenue in night_revenue(booking):
+            if (since is not None and night < since) or (until is not None and night >= until):
+                continue
+            delta = self.deltas[(booking.room_id, night)]
+            delta[0] += sign
+            delta[1] += sign * revenue
+
+    def cancellation(self, room_id: int, when: datetime, refund: Optional[float]):
+        delta = self.deltas[(room_id, when.date())]
+        delta[2] += 1
+        delta[3] += refund or 0.0
+
+    def flush(self, db: Session):
+        """Apply and clear the deltas. Does not commit."""
+        rows = [
+            {"room_id": room_id, "day": day, **dict(zip(COUNTERS, delta))}
+            for (room_id, day), delta in self.deltas.items()
+            if any(delta)
+        ]
+        self.deltas.clear()
+        if not rows:
+            return
+        stats = models.RoomDailyStats.__table__
+        statement = database.upsert_insert(db, models.RoomDailyStats)
+        if statement is not None:
+            statement = statement.on_conflict_do_update(
+                index_elements=["room_id", "day"],
+                set_={name: stats.c[name] + statement.excluded[name] for name in COUNTERS}
+            )
+            db.execute(statement, rows)
+            return
+        for row in rows:
+            result = db.execute(
+                update(stats)
+                .where(stats.c.room_id == row["room_id"], stats.c.day == row["day"])
+                .values({name: stats.c[name] + row[name] for name in COUNTERS})
+            )
+            if result.rowcount == 0:
+                db.execute(insert(stats).values(**row))
+
+def rebuild(db: Session) -> int:
+    """Recompute every rollup row from the bookings table; returns the number of bookings read"""
+    db.execute(delete(models.RoomDailyStats))
+    rollup = Rollup()
+    count = 0
+    rows = db.execute(
+        select(
+            models.Booking.room_id,
+            models.Booking.start_date,
+            models.Booking.end_date,
+            models.Booking.total_price,
+            models.Booking.nightly_rates,
+            models.Booking.status,
+            models.Booking.cancelled_at,
+            models.Booking.refund_amount
+        ).where(models.Booking.room_id.isnot(None))
+    )
+    for row in rows:
+        count += 1
+        if row.status != "cancelled":
+            rollup.stay(row)
+        elif row.cancelled_at is not None:
+            rollup.stay(row, until=row.cancelled_at.date())  # nights stayed before the cancellation
+            rollup.cancellation(row.room_id, row.cancelled_at, row.refund_amount)
+    rollup.flush(db)
+    db.commit()
+    return count
+
+def _metrics(rooms: int, days: int, nights_sold, revenue, cancellations, refunds) -> Dict:
+    available = rooms * days
+    nights_sold = int(nights_sold or 0)
+    revenue = revenue or 0.0
+    return {
+        "nights_sold": nights_sold,
+        "available_nights": available,
+        "occupancy_rate": round(nights_sold / available, 4) if available else 0.0,
+        "revenue": round(revenue, 2),
+        "adr": round(revenue / nights_sold, 2) if nights_sold else 0.0,
+        "cancellations": int(cancellations or 0),
+        "refunds": round(refunds or 0.0, 2),
+    }
+
+def _room_filters(host_id: Optional[int], room_id: Optional[int]) -> List:
+    filters = [models.Room.is_deleted == False]
+    if host_id is not None:
+        filters.append(models.Room.host_id == host_id)
+    if room_id is not None:
+        filters.append(models.Room.id == room_id)
+    return filters
+
+def _sums(host_id: Optional[int], room_id: Optional[int], start_date: date, end_date: date, *group_by):
+    """Counter sums over the rollup rows in scope, grouped by the given columns"""
+    stats = models.RoomDailyStats
+    return select(*group_by, *(func.sum(getattr(stats, name)).label(name) for name in COUNTERS)).join(
+        models.Room, models.Room.id == stats.room_id
+    ).where(
+        stats.day >= start_date,
+        stats.day <= end_date,
+        *_room_filters(host_id, room_id)
+    ).group_by(*group_by)
+
+def _room_count(host_id: Optional[int], room_id: Optional[int]):
+    return select(func.count()).select_from(models.Room).where(*_room_filters(host_id, room_id))
+
+async def summary(db: AsyncSession, start_date: date, end_date: date, host_id: Optional[int] = None, room_id: Optional[int] = None) -> Dict:
+    """Totals over the days start_date..end_date inclusive"""
+    days = (end_date - start_date).days + 1
+    rooms = (await db.execute(_room_count(host_id, room_id))).scalar()
+    totals = (await db.execute(_sums(host_id, room_id, start_date, end_date))).one()
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "days": days,
+        "rooms": rooms,
+        **_metrics(rooms, days, *totals),
+    }
+
+async def daily(db: AsyncSession, start_date: date, end_date: date, host_id: Optional[int] = None, room_id: Optional[int] = None) -> List[Dict]:
+    """One entry per day start_date..end_date, days without activity included"""
+    rooms = (await db.execute(_room_count(host_id, room_id))).scalar()
+    by_day = {
+        row.day: row[1:]
+        for row in (await db.execute(
+            _sums(host_id, room_id, start_date, end_date, models.RoomDailyStats.day)
+        )).all()
+    }
+    result = []
+    for offset in range((end_date - start_date).days + 1):
+        day = start_date + timedelta(days=offset)
+        result.append({"day": day, **_metrics(rooms, 1, *by_day.get(day, (0, 0.0, 0, 0.0)))})
+    return result
+
+async def per_room(db: AsyncSession, start_date: date, end_date: date, host_id: Optional[int] = None, room_id: Optional[int] = None) -> List[Dict]:
+    """Totals of each room in scope over start_date..end_date, by room id"""
+    days = (end_date - start_date).days + 1
+    room_ids = (await db.execute(
+        select(models.Room.id).where(*_room_filters(host_id, room_id)).order_by(models.Room.id)
+    )).scalars().all()
+    by_room = {
+        row.room_id: row[1:]
+        for row in (await db.execute(
+            _sums(host_id, room_id, start_date, end_date, models.RoomDailyStats.room_id)
+        )).all()
+    }
+    return [
+        {"room_id": room_id, **_metrics(1, days, *by_room.get(room_id, (0, 0.0, 0, 0.0)))}
+        for room_id in room_ids
+    ]
@@ -1,12 +1,16 @@
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import NamedTuple, Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from . import schemas, database, models
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from . import schemas, database, models, cache, metrics
+import asyncio
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -15,7 +19,29 @@ SECRET_KEY = os.getenv("SECRET_KEY", "fallbacksecret")
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", 30))
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Resolved principals keyed by token subject (email). Entries are dropped when
+# the user row changes; the TTL bounds staleness for writes made outside the ORM.
+PRINCIPAL_CACHE_SIZE = int(os.getenv("PRINCIPAL_CACHE_SIZE", 10000))
+PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", 60))
+PRINCIPAL_COLUMNS = ("id", "email", "full_name", "role", "is_active")
+
+principal_cache = cache.get_cache("principals", PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL)
+
+# bcrypt cost; stored hashes with a different cost are rehashed on the next successful login
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+# Hashing runs on its own threads (bcrypt releases the GIL) so a login burst
+# cannot occupy the request threadpool; past HASH_MAX_PENDING queued jobs
+# requests are turned away with 503 instead of queueing without bound.
+HASH_WORKERS = int(os.getenv("HASH_WORKERS", os.cpu_count() or 1))
+HASH_MAX_PENDING = int(os.getenv("HASH_MAX_PENDING", HASH_WORKERS * 8))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+    bcrypt__max_rounds=BCRYPT_ROUNDS,
+)
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 
 def verify_password(plain_password, hashed_password):
@@ -24,6 +50,48 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+_hash_executor = ThreadPoolExecutor(max_workers=HASH_WORKERS, thread_name_prefix="bcrypt")
+_hash_pending = 0
+hash_queue_wait = metrics.Timer()
+hash_rejections = metrics.Counter()
+
+async def _run_hashing(fn, *args):
+    global _hash_pending
+    if _hash_pending >= HASH_MAX_PENDING:
+        hash_rejections.add()
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, please retry",
+            headers={"Retry-After": "1"},
+        )
+    _hash_pending += 1
+    queued = time.perf_counter()
+
+    def job():
+        hash_queue_wait.observe(time.perf_counter() - queued)
+        return fn(*args)
+
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, job)
+    finally:
+        _hash_pending -= 1
+
+metrics.register("password_hashing", lambda: {
+    "bcrypt_rounds": BCRYPT_ROUNDS,
+    "workers": HASH_WORKERS,
+    "max_pending": HASH_MAX_PENDING,
+    "pending": _hash_pending,
+    "rejected": hash_rejections.value,
+    "queue_wait": hash_queue_wait.summary(),
+})
+
+async def verify_and_update_password(plain_password, hashed_password):
+    """(verified, new_hash) off the event loop; new_hash is set when the stored hash should be replaced"""
+    return await _run_hashing(pwd_context.verify_and_update, plain_password, hashed_password)
+
+async def hash_password(password):
+    return await _run_hashing(pwd_context.hash, password)
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -34,7 +102,48 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+class Principal(NamedTuple):
+    """The authenticated user as read from the principal cache. Not an ORM row:
+    load models.User from the session to write to the user or follow its relationships."""
+    id: int
+    email: str
+    full_name: Optional[str]
+    role: str
+    is_active: bool
+
+def invalidate_principal(email: str):
+    principal_cache.delete(email)
+
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    emails = {target.email, *inspect(target).attrs.email.history.deleted}
+    for email in emails:
+        invalidate_principal(email)
+    # Again once committed, in case a concurrent request re-cached the old row meanwhile
+    session = object_session(target)
+    if session is not None:
+        session.info.setdefault("stale_principals", set()).update(emails)
+
+@event.listens_for(Session, "after_commit")
+def _invalidate_committed(session):
+    for email in session.info.pop("stale_principals", ()):
+        invalidate_principal(email)
+
+def load_principal(email: str) -> Optional[dict]:
+    principal = principal_cache.get(email)
+    if principal is None:
+        with database.SessionLocal() as db:
+            user = db.query(*(getattr(models.User, column) for column in PRINCIPAL_COLUMNS)).filter(
+                models.User.email == email
+            ).first()
+        if user is None:
+            return None
+        principal = dict(user._mapping)
+        principal_cache.set(email, principal)
+    return principal
+
+def get_current_user(token: str = Depends(oauth2_scheme)) -> Principal:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -50,17 +159,17 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
     except JWTError:
         raise credentials_exception
     
-    user = db.query(models.User).filter(models.User.email == token_data.email).first()
-    if user is None:
+    principal = load_principal(token_data.email)
+    if principal is None:
         raise credentials_exception
-    return user
+    return Principal(**principal)
 
-def get_current_active_user(current_user: models.User = Depends(get_current_user)):
+def get_current_active_user(current_user: Principal = Depends(get_current_user)):
     if not current_user.is_active:
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
-def get_current_admin_user(current_user: models.User = Depends(get_current_active_user)):
+def get_current_admin_user(current_user: Principal = Depends(get_current_active_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Not authorized")
     return current_user
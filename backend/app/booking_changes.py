@@ -0,0 +1,142 @@
+"""
+Booking modification engine.
+A booking keeps the nightly rates it was quoted (Booking.nightly_rates). A date
+change reprices only the nights that are new to the stay, at today's calendar
+prices; nights the guest keeps keep their rate. The long-stay discount is then
+worked out again for the new length. Only the new nights can collide with other
+bookings or blocked days, so only they are checked: one indexed query under the
+room's reservation lock, and the booking, its BookingModification row and the
+analytics rollup (old stay out, new stay in) are committed together.
+
+Bookings made before nightly rates were stored are repriced in full.
+"""
+from datetime import date, datetime, timedelta
+from typing import List, NamedTuple, Optional, Tuple
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models, pricing, inventory, analytics
+
+ONE_DAY = timedelta(days=1)
+
+class InvalidModification(Exception):
+    pass
+
+class Repricing(NamedTuple):
+    nightly_rates: List[float]
+    total: float
+    nights_repriced: int
+
+def added_windows(old_start: date, old_end: date, new_start: date, new_end: date) -> List[Tuple[date, date]]:
+    """[start, end) windows of nights in the new stay but not in the old one"""
+    if new_end <= old_start or new_start >= old_end:
+        return [(new_start, new_end)]
+    windows = []
+    if new_start < old_start:
+        windows.append((new_start, old_start))
+    if new_end > old_end:
+        windows.append((old_end, new_end))
+    return windows
+
+def reprice(db: Session, booking: models.Booking, room: models.Room, new_start: date, new_end: date) -> Repricing:
+    """Rates of the new stay: kept nights at their booked rate, the rest quoted now"""
+    old_nights = pricing.stay_nights(booking.start_date.date(), booking.end_date.date())
+    booked_rates = {}
+    if booking.nightly_rates and len(booking.nightly_rates) == len(old_nights):
+        booked_rates = dict(zip(old_nights, booking.nightly_rates))
+
+    new_nights = pricing.stay_nights(new_start, new_end)
+    to_price = [night for night in new_nights if night not in booked_rates]
+    quoted = {}
+    if to_price:
+        windows = [pricing.Stay(room.id, start, end) for start, end in _runs(to_price)]
+        overrides = pricing.group_overrides(db.execute(pricing.overrides_query(windows)))
+        ranges = overrides.get(room.id, [])
+        for window in windows:
+            nights = pricing.stay_nights(window.start_date, window.end_date)
+            rates = pricing.price_nights(room, nights, pricing.stay_overrides(ranges, window.start_date, window.end_date))
+            quoted.update(zip(nights, rates))
+
+    rates = [booked_rates.get(night, quoted.get(night)) for night in new_nights]
+    subtotal = sum(rates)
+    discount = subtotal * pricing.long_stay_discount_pct(room, len(rates)) / 100
+    return Repricing(rates, round(subtotal - discount, 2), len(to_price))
+
+def _runs(nights: List[date]) -> List[Tuple[date, date]]:
+    """Consecutive nights grouped into [start, end) windows"""
+    runs = []
+    for night in nights:
+        if runs and runs[-1][1] == night:
+            runs[-1] = (runs[-1][0], night + ONE_DAY)
+        else:
+            runs.append((night, night + ONE_DAY))
+    return runs
+
+def modify(
+    db: Session,
+    booking: models.Booking,
+    new_start: Optional[datetime],
+    new_end: Optional[datetime],
+    new_guests: Optional[int],
+    reason: Optional[str],
+    user_id: int
+) -> models.BookingModification:
+    """Apply a modification atomically; raises InvalidModification or
+    inventory.BookingConflict (nothing is written then)"""
+    with inventory.reservation_lock(db, booking.room_id):
+        # State as of the lock, not as of the request; the row lock also waits out
+        # a cancel in flight, which locks the booking rather than the room
+        db.refresh(booking, with_for_update=True)
+        start = new_start or booking.start_date
+        end = new_end or booking.end_date
+        if booking.status == "cancelled":
+            db.rollback()
+            raise InvalidModification("Cannot modify cancelled booking")
+        if end.date() <= start.date():
+            db.rollback()
+            raise InvalidModification("new_end_date must be after new_start_date")
+        if (end.date() - start.date()).days > pricing.MAX_STAY_NIGHTS:
+            db.rollback()
+            raise InvalidModification(f"Stays are limited to {pricing.MAX_STAY_NIGHTS} nights")
+
+        room = db.get(models.Room, booking.room_id)
+        old_start, old_end = booking.start_date.date(), booking.end_date.date()
+        windows = added_windows(old_start, old_end, start.date(), end.date())
+        if windows and inventory.has_conflict_in(db, booking.room_id, windows, exclude_booking_id=booking.id):
+            db.rollback()
+            raise inventory.BookingConflict()
+
+        repriced = reprice(db, booking, room, start.date(), end.date())
+        modification = models.BookingModification(
+            booking_id=booking.id,
+            old_start_date=booking.start_date,
+            old_end_date=booking.end_date,
+            new_start_date=start,
+            new_end_date=end,
+            old_guests=booking.guests,
+            new_guests=new_guests or booking.guests,
+            old_price=booking.total_price,
+            new_price=repriced.total,
+            price_difference=round(repriced.total - booking.total_price, 2),
+            modification_reason=reason,
+            modified_by_user_id=user_id
+        )
+        rollup = analytics.Rollup()
+        rollup.stay(booking, -1)
+        booking.start_date = start
+        booking.end_date = end
+        booking.guests = new_guests or booking.guests
+        booking.total_price = repriced.total
+        booking.nightly_rates = repriced.nightly_rates
+        booking.status = "modified"
+        booking.updated_at = datetime.utcnow()
+        db.add(modification)
+        rollup.stay(booking)
+        rollup.flush(db)
+        try:
+            db.commit()
+        except IntegrityError:
+            # bookings_no_overlap exclusion constraint (PostgreSQL)
+            db.rollback()
+            raise inventory.BookingConflict()
+    db.refresh(modification)
+    return modification
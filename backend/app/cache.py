@@ -0,0 +1,144 @@
+"""
+Small key/value caches with a TTL and a size bound.
+Each cache is an in-process LRU; when CACHE_REDIS_URL is set (and the redis
+package is installed) values live in Redis instead, so every worker sees the
+same entries and the same invalidations. Values must be JSON-serializable.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from . import metrics
+
+REDIS_URL = os.getenv("CACHE_REDIS_URL")
+
+_caches: Dict[str, "LocalCache"] = {}
+
+class LocalCache:
+    backend = "local"
+
+    def __init__(self, name: str, maxsize: int, ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, value)
+        self.hits = metrics.Counter()
+        self.misses = metrics.Counter()
+        self.evictions = metrics.Counter()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits.add()
+                return entry[1]
+            if entry is not None:
+                del self._entries[key]
+        self.misses.add()
+        return None
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions.add()
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def size(self) -> Optional[int]:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            "backend": self.backend,
+            "size": self.size(),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            "evictions": self.evictions.value,
+        }
+
+class RedisCache(LocalCache):
+    """Same interface backed by Redis; errors count as misses so an outage only costs queries"""
+    backend = "redis"
+
+    def __init__(self, name: str, maxsize: int, ttl: float, client):
+        super().__init__(name, maxsize, ttl)
+        self._client = client
+        self._prefix = f"cache:{name}:"
+        self.errors = metrics.Counter()
+
+    def get(self, key: str) -> Optional[Any]:
+        try:
+            raw = self._client.get(self._prefix + key)
+        except Exception:
+            self.errors.add()
+            raw = None
+        if raw is None:
+            self.misses.add()
+            return None
+        self.hits.add()
+        return json.loads(raw)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self._client.set(self._prefix + key, json.dumps(value), px=int((self.ttl if ttl is None else ttl) * 1000))
+        except Exception:
+            self.errors.add()
+
+    def delete(self, key: str):
+        try:
+            self._client.delete(self._prefix + key)
+        except Exception:
+            self.errors.add()
+
+    def clear(self):
+        try:
+            for key in self._client.scan_iter(match=self._prefix + "*"):
+                self._client.delete(key)
+        except Exception:
+            self.errors.add()
+
+    def size(self) -> Optional[int]:
+        return None
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats["errors"] = self.errors.value
+        return stats
+
+_redis_client = None
+
+def _redis():
+    global _redis_client
+    if _redis_client is None:
+        import redis  # optional dependency, only needed with CACHE_REDIS_URL
+        _redis_client = redis.Redis.from_url(REDIS_URL, socket_timeout=0.25)
+    return _redis_client
+
+def get_cache(name: str, maxsize: int = 1024, ttl: float = 60) -> LocalCache:
+    """Create (or return the existing) cache called name"""
+    if name not in _caches:
+        if REDIS_URL:
+            _caches[name] = RedisCache(name, maxsize, ttl, _redis())
+        else:
+            _caches[name] = LocalCache(name, maxsize, ttl)
+    return _caches[name]
+
+metrics.register("caches", lambda: {name: cache.stats() for name, cache in _caches.items()})
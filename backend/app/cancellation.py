@@ -0,0 +1,140 @@
+"""
+Cancellation policies and refunds.
+Each policy is a list of tiers (minimum whole days before check-in, % refunded),
+most generous first; a cancellation gets the first tier it qualifies for and
+nothing if it qualifies for none. Unknown policies refund nothing.
+
+refunds() evaluates many bookings at once against the tiers compiled into
+sorted thresholds (one bisect per booking), and cancel_many() cancels a whole
+selection of bookings in a single transaction with one batched UPDATE (and
+one batched analytics rollup upsert).
+"""
+from bisect import bisect_right
+from datetime import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.orm import Session
+from . import models, analytics
+
+# None: any time, including after check-in
+POLICY_TIERS: Dict[str, List[Tuple[Optional[int], float]]] = {
+    "flexible": [(1, 100.0), (None, 50.0)],
+    "moderate": [(5, 100.0), (1, 50.0)],
+    "strict": [(14, 100.0), (7, 50.0)],
+}
+
+# Bookings in these states cannot be cancelled
+FINAL_STATUSES = ("cancelled", "completed")
+
+class Refund(NamedTuple):
+    booking_id: int
+    user_id: int
+    room_id: int
+    start_date: datetime
+    end_date: datetime
+    total_price: float
+    cancellation_policy: Optional[str]
+    days_until_checkin: int
+    refund_pct: float
+    refund_amount: float
+
+def _compile(tiers) -> Tuple[List[float], List[float]]:
+    """Ascending thresholds and the percentage from each threshold upwards"""
+    thresholds, percentages = [float("-inf")], [0.0]
+    for min_days, pct in sorted(tiers, key=lambda tier: float("-inf") if tier[0] is None else tier[0]):
+        if min_days is None:
+            percentages[0] = pct
+        else:
+            thresholds.append(min_days)
+            percentages.append(pct)
+    return thresholds, percentages
+
+COMPILED_TIERS = {policy: _compile(tiers) for policy, tiers in POLICY_TIERS.items()}
+NO_REFUND = ([float("-inf")], [0.0])
+
+def days_until_checkin(start_date: datetime, when: datetime) -> int:
+    return (start_date - when).days
+
+def refund_pcts(policies: Sequence[str], days: Sequence[int]) -> List[float]:
+    """Refund percentage for each (policy, days before check-in) pair"""
+    result = []
+    for policy, day_count in zip(policies, days):
+        thresholds, percentages = COMPILED_TIERS.get(policy, NO_REFUND)
+        result.append(percentages[bisect_right(thresholds, day_count) - 1])
+    return result
+
+def refunds(bookings: Sequence, when: datetime, full_refund: bool = False) -> List[Refund]:
+    """Refunds of many bookings cancelled at `when`; full_refund ignores the
+    policies (e.g. the property itself cannot host the stay)"""
+    days = [days_until_checkin(booking.start_date, when) for booking in bookings]
+    policies = [booking.cancellation_policy for booking in bookings]
+    pcts = [100.0] * len(bookings) if full_refund else refund_pcts(policies, days)
+    return [
+        Refund(
+            booking_id=booking.id,
+            user_id=booking.user_id,
+            room_id=booking.room_id,
+            start_date=booking.start_date,
+            end_date=booking.end_date,
+            total_price=booking.total_price,
+            cancellation_policy=policy,
+            days_until_checkin=day_count,
+            refund_pct=pct,
+            refund_amount=round(booking.total_price * pct / 100, 2),
+        )
+        for booking, policy, day_count, pct in zip(bookings, policies, days, pcts)
+    ]
+
+def refund_amount(booking: models.Booking, when: datetime) -> float:
+    return refunds([booking], when)[0].refund_amount
+
+def cancellable(room_ids: Optional[List[int]], lower: Optional[datetime], upper: Optional[datetime], now: datetime):
+    """Bookings not yet over and not cancelled/completed, on the rooms and/or
+    overlapping the (lower, upper) bounds of inventory.night_bounds, locked for update"""
+    query = select(
+        models.Booking.id,
+        models.Booking.user_id,
+        models.Booking.room_id,
+        models.Booking.start_date,
+        models.Booking.end_date,
+        models.Booking.total_price,
+        models.Booking.nightly_rates,
+        models.Booking.cancellation_policy
+    ).where(
+        models.Booking.status.notin_(FINAL_STATUSES),
+        models.Booking.end_date > now
+    )
+    if room_ids:
+        query = query.where(models.Booking.room_id.in_(room_ids))
+    if lower is not None and upper is not None:
+        query = query.where(models.Booking.start_date < upper, models.Booking.end_date >= lower)
+    return query.order_by(models.Booking.id).with_for_update()
+
+def cancel_many(db: Session, selection, reason: Optional[str], now: datetime, full_refund: bool = False, dry_run: bool = False) -> List[Refund]:
+    """Compute refunds for every booking the query selects and cancel them with one
+    batched UPDATE; commits unless dry_run (then nothing is written)"""
+    rows = db.execute(selection).all()
+    results = refunds(rows, now, full_refund)
+    if dry_run or not results:
+        db.rollback()
+        return results
+    bookings = models.Booking.__table__
+    db.execute(
+        update(bookings)
+        .where(bookings.c.id == bindparam("b_id"))
+        .values(
+            status="cancelled",
+            cancelled_at=now,
+            cancellation_reason=reason,
+            refund_amount=bindparam("b_refund"),
+            updated_at=now,
+        ),
+        [{"b_id": result.booking_id, "b_refund": result.refund_amount} for result in results]
+    )
+    rollup = analytics.Rollup()
+    for row, result in zip(rows, results):
+        rollup.stay(row, -1, since=now.date())  # nights already stayed remain sold
+        rollup.cancellation(row.room_id, now, result.refund_amount)
+    rollup.flush(db)
+    db.commit()
+    return results
@@ -1,5 +1,9 @@
+from typing import List, Optional
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from . import models, schemas, auth
+from . import models, schemas, auth, inventory, geo, suggest, response_cache, images, gallery, analytics
 
 def get_user(db: Session, user_id: int):
     return db.query(models.User).filter(models.User.id == user_id).first()
@@ -7,12 +11,11 @@ def get_user(db: Session, user_id: int):
 def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = auth.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
     db_user = models.User(
         email=user.email,
         full_name=user.full_name,
-        hashed_password=hashed_password,
+        hashed_password=hashed_password or auth.get_password_hash(user.password),
         role=user.role
     )
     db.add(db_user)
@@ -20,26 +23,104 @@ def create_user(db: Session, user: schemas.UserCreate):
     db.refresh(db_user)
     return db_user
 
-def create_room(db: Session, room: schemas.RoomCreate, image_url: str = None, host_id: int = None):
-    db_room = models.Room(**room.model_dump(), image_url=image_url, host_id=host_id)
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    return (await db.execute(select(models.User).where(models.User.email == email))).scalars().first()
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate, hashed_password: str):
+    """create_user for AsyncSession callers; the password is hashed by the caller"""
+    db_user = models.User(
+        email=user.email,
+        full_name=user.full_name,
+        hashed_password=hashed_password,
+        role=user.role
+    )
+    db.add(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    return db_user
+
+FEATURE_AMENITY = "amenity"
+FEATURE_BOOKING_OPTION = "booking_option"
+
+def sync_room_features(db: Session, db_room: models.Room):
+    """Rebuild the room_features index rows from the room's JSON lists"""
+    db.query(models.RoomFeature).filter(
+        models.RoomFeature.room_id == db_room.id
+    ).delete(synchronize_session=False)
+
+    for kind, values in (
+        (FEATURE_AMENITY, db_room.amenities),
+        (FEATURE_BOOKING_OPTION, db_room.booking_options),
+    ):
+        for value in set(values or []):
+            db.add(models.RoomFeature(room_id=db_room.id, kind=kind, value=value))
+
+def sync_room_geohash(db_room: models.Room):
+    if db_room.latitude is not None and db_room.longitude is not None:
+        db_room.geohash = geo.encode(db_room.latitude, db_room.longitude)
+    else:
+        db_room.geohash = None
+
+def create_room(db: Session, room: schemas.RoomCreate, image: Optional[images.SavedUpload] = None, host_id: int = None):
+    db_room = models.Room(**room.model_dump(), host_id=host_id)
+    if image:
+        gallery.set_cover(db, db_room, image)
+    sync_room_geohash(db_room)
     db.add(db_room)
+    db.flush()  # assign db_room.id for the feature index
+    sync_room_features(db, db_room)
     db.commit()
     db.refresh(db_room)
+    suggest.index.upsert_room(db_room)
+    response_cache.invalidate(*response_cache.room_tags(db_room.id))
     return db_room
 
-def update_room(db: Session, room_id: int, room_update: schemas.RoomUpdate):
-    db_room = db.query(models.Room).filter(models.Room.id == room_id).first()
-    if not db_room:
-        return None
-    
+def apply_room_update(db: Session, db_room: models.Room, room_update: schemas.RoomUpdate, image: Optional[images.SavedUpload] = None):
     update_data = room_update.model_dump(exclude_unset=True)
     for key, value in update_data.items():
         setattr(db_room, key, value)
-    
+    if image:
+        gallery.set_cover(db, db_room, image)
+
+    if "amenities" in update_data or "booking_options" in update_data:
+        sync_room_features(db, db_room)
+    if "latitude" in update_data or "longitude" in update_data:
+        sync_room_geohash(db_room)
+
     db.commit()
     db.refresh(db_room)
+    suggest.index.upsert_room(db_room)
+    response_cache.invalidate(*response_cache.room_tags(db_room.id))
     return db_room
 
+def _commit_gallery(db: Session, db_room: models.Room):
+    db.commit()
+    db.refresh(db_room)
+    response_cache.invalidate(*response_cache.room_tags(db_room.id))
+    return db_room
+
+def add_room_images(db: Session, db_room: models.Room, uploads: List[images.SavedUpload]):
+    gallery.add_images(db, db_room, uploads)
+    return _commit_gallery(db, db_room)
+
+def remove_room_image(db: Session, db_room: models.Room, image_id: str):
+    gallery.remove_image(db, db_room, image_id)
+    return _commit_gallery(db, db_room)
+
+def reorder_room_images(db: Session, db_room: models.Room, image_ids: List[str]):
+    gallery.reorder_images(db, db_room, image_ids)
+    return _commit_gallery(db, db_room)
+
+def update_room(db: Session, room_id: int, room_update: schemas.RoomUpdate):
+    db_room = db.query(models.Room).filter(
+        models.Room.id == room_id,
+        models.Room.is_deleted == False
+    ).first()
+    if not db_room:
+        return None
+    
+    return apply_room_update(db, db_room, room_update)
+
 def delete_room(db: Session, room_id: int):
     # Soft delete
     db_room = db.query(models.Room).filter(models.Room.id == room_id).first()
@@ -48,16 +129,15 @@ def delete_room(db: Session, room_id: int):
     
     db_room.is_deleted = True
     db.commit()
+    suggest.index.remove_room(room_id)
+    response_cache.invalidate(*response_cache.room_tags(room_id))
     return db_room
 
 def get_rooms(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Room).filter(models.Room.is_deleted == False).offset(skip).limit(limit).all()
+    return db.query(models.Room).filter(models.Room.is_deleted == False).order_by(models.Room.id).offset(skip).limit(limit).all()
 
 def get_all_rooms_admin(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Room).filter(models.Room.is_deleted == False).offset(skip).limit(limit).all()
-
-def get_user_bookings(db: Session, user_id: int):
-    return db.query(models.Booking).filter(models.Booking.user_id == user_id).all()
+    return db.query(models.Room).filter(models.Room.is_deleted == False).order_by(models.Room.id).offset(skip).limit(limit).all()
 
 def create_booking(
     db: Session, 
@@ -65,7 +145,8 @@ def create_booking(
     user_id: int, 
     total_price: float,
     payment_status: str = "pending",
-    booking_status: str = "pending"
+    booking_status: str = "pending",
+    nightly_rates: Optional[List[float]] = None
 ):
     db_booking = models.Booking(
         user_id=user_id,
@@ -74,11 +155,25 @@ def create_booking(
         end_date=booking.end_date,
         guests=booking.guests,
         total_price=total_price,
+        nightly_rates=nightly_rates,
         status=booking_status,
         payment_method=booking.payment_method,
         payment_status=payment_status
     )
-    db.add(db_booking)
-    db.commit()
+    with inventory.reservation_lock(db, booking.room_id):
+        if inventory.has_conflict(db, booking.room_id, booking.start_date.date(), booking.end_date.date()):
+            db.rollback()
+            raise inventory.BookingConflict()
+        db.add(db_booking)
+        rollup = analytics.Rollup()
+        rollup.stay(db_booking)
+        rollup.flush(db)
+        try:
+            db.commit()
+        except IntegrityError:
+            # bookings_no_overlap exclusion constraint (PostgreSQL)
+            db.rollback()
+            raise inventory.BookingConflict()
+    response_cache.invalidate("calendar")
     db.refresh(db_booking)
     return db_booking
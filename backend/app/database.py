@@ -1,8 +1,14 @@
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 import os
 from dotenv import load_dotenv
+from . import metrics
 
 load_dotenv()
 
@@ -15,14 +21,159 @@ SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
 if not SQLALCHEMY_DATABASE_URL:
     raise ValueError("DATABASE_URL is not set in .env file")
 
-engine = create_engine(SQLALCHEMY_DATABASE_URL)
+# Async drivers for the same database, used by the read-heavy async endpoints
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+def async_database_url(url: str):
+    url = make_url(url)
+    backend = url.get_backend_name()
+    if backend not in ASYNC_DRIVERS:
+        raise ValueError(f"No async driver configured for '{backend}' databases")
+    return url.set(drivername=ASYNC_DRIVERS[backend])
+
+# Connection pool settings (per engine, per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))  # seconds, -1 disables
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "false").lower() in ("1", "true", "yes")
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 0))  # 0 disables
+
+def engine_options(url, is_async: bool = False) -> dict:
+    url = make_url(url)
+    options = {
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+    }
+    # In-memory SQLite uses a single-connection pool without sizing options
+    if url.database not in (None, "", ":memory:"):
+        options.update(
+            pool_size=DB_POOL_SIZE,
+            max_overflow=DB_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+        )
+    if DB_STATEMENT_TIMEOUT_MS and url.get_backend_name() == "postgresql":
+        if is_async:
+            options["connect_args"] = {"server_settings": {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"}
+    return options
+
+class PoolStats:
+    """Pool events, the time spent waiting for a pooled connection, and the
+    session duration seen by get_db / get_async_db"""
+    def __init__(self, engine):
+        self.engine = engine
+        self._lock = threading.Lock()
+        self.connects = metrics.Counter()
+        self.checkouts = metrics.Counter()
+        self.invalidations = metrics.Counter()
+        self.checked_out = 0
+        self.peak_checked_out = 0
+        self.connection_wait = metrics.Timer()
+        self.session_duration = metrics.Timer()
+
+        event.listen(engine, "connect", lambda *args: self.connects.add())
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", lambda *args: self.invalidations.add())
+        # Time every checkout where it happens (the first query of a session),
+        # so requests that never query hold no connection; engine.dispose()
+        # replaces the pool, so the new one is wrapped again
+        event.listen(engine, "engine_disposed", self._time_checkouts)
+        self._time_checkouts()
+
+    def _time_checkouts(self, *args):
+        pool = self.engine.pool
+        connect = pool.connect
+
+        def timed_connect():
+            started = time.perf_counter()
+            try:
+                return connect()
+            finally:
+                self.connection_wait.observe(time.perf_counter() - started)
+
+        pool.connect = timed_connect
+
+    def _on_checkout(self, *args):
+        self.checkouts.add()
+        with self._lock:
+            self.checked_out += 1
+            self.peak_checked_out = max(self.peak_checked_out, self.checked_out)
+
+    def _on_checkin(self, *args):
+        with self._lock:
+            self.checked_out = max(0, self.checked_out - 1)
+
+    def summary(self) -> dict:
+        pool = self.engine.pool
+        return {
+            "pool": pool.__class__.__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "checked_out": self.checked_out,
+            "peak_checked_out": self.peak_checked_out,
+            "connects": self.connects.value,
+            "checkouts": self.checkouts.value,
+            "invalidations": self.invalidations.value,
+            "connection_wait": self.connection_wait.summary(),
+            "session_duration": self.session_duration.summary(),
+        }
+
+engine = create_engine(SQLALCHEMY_DATABASE_URL, **engine_options(SQLALCHEMY_DATABASE_URL))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(
+    async_database_url(SQLALCHEMY_DATABASE_URL),
+    **engine_options(SQLALCHEMY_DATABASE_URL, is_async=True)
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
 Base = declarative_base()
 
+pool_stats = PoolStats(engine)
+async_pool_stats = PoolStats(async_engine.sync_engine)
+
+metrics.register("database", lambda: {
+    "settings": {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "statement_timeout_ms": DB_STATEMENT_TIMEOUT_MS,
+    },
+    "sync": pool_stats.summary(),
+    "async": async_pool_stats.summary(),
+})
+
+def upsert_insert(db, model):
+    """INSERT into model that supports on_conflict_do_update() on this session's
+    database, or None where the dialect has no upsert (callers fall back)"""
+    dialect = db.get_bind().dialect.name
+    if dialect == "postgresql":
+        return postgresql.insert(model)
+    if dialect == "sqlite":
+        return sqlite.insert(model)
+    return None
+
 def get_db():
     db = SessionLocal()
+    started = time.perf_counter()
     try:
         yield db
     finally:
         db.close()
+        pool_stats.session_duration.observe(time.perf_counter() - started)
+
+async def get_async_db():
+    started = time.perf_counter()
+    try:
+        async with AsyncSessionLocal() as db:
+            yield db
+    finally:
+        async_pool_stats.session_duration.observe(time.perf_counter() - started)
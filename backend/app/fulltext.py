@@ -0,0 +1,92 @@
+"""
+Ranked full-text search over room title, description and location.
+PostgreSQL: a GIN index on a to_tsvector expression; queries repeat the exact
+same expression so the planner uses the index, and it stays current on its own.
+SQLite: an external-content FTS5 table kept current by triggers on rooms.
+"""
+import re
+from sqlalchemy import column, false, func, literal_column, select, table, text
+from . import models
+
+TSVECTOR = (
+    "to_tsvector('english', coalesce(rooms.title, '') || ' ' || "
+    "coalesce(rooms.description, '') || ' ' || coalesce(rooms.location, ''))"
+)
+
+POSTGRES_DDL = [
+    f"CREATE INDEX IF NOT EXISTS ix_rooms_fulltext ON rooms USING GIN ({TSVECTOR})",
+]
+
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS rooms_fts USING fts5(
+        title, description, location,
+        content='rooms', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS rooms_fts_ai AFTER INSERT ON rooms BEGIN
+        INSERT INTO rooms_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS rooms_fts_ad AFTER DELETE ON rooms BEGIN
+        INSERT INTO rooms_fts(rooms_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS rooms_fts_au AFTER UPDATE OF title, description, location ON rooms BEGIN
+        INSERT INTO rooms_fts(rooms_fts, rowid, title, description, location)
+        VALUES ('delete', old.id, old.title, old.description, old.location);
+        INSERT INTO rooms_fts(rowid, title, description, location)
+        VALUES (new.id, new.title, new.description, new.location);
+    END""",
+]
+
+rooms_fts = table("rooms_fts", column("rowid"), column("rank"))
+
+def ensure_index(engine):
+    """Create the full-text index for the engine's dialect (idempotent)"""
+    with engine.begin() as conn:
+        if engine.dialect.name == "postgresql":
+            for statement in POSTGRES_DDL:
+                conn.execute(text(statement))
+        elif engine.dialect.name == "sqlite":
+            existed = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'rooms_fts'"
+            )).first()
+            for statement in SQLITE_DDL:
+                conn.execute(text(statement))
+            if not existed:
+                conn.execute(text("INSERT INTO rooms_fts(rooms_fts) VALUES ('rebuild')"))
+
+def _fts5_query(q: str) -> str:
+    """Quote each word (no FTS5 syntax from users); the last one matches as a prefix"""
+    words = re.findall(r"\w+", q)
+    if not words:
+        return ""
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += "*"
+    return " ".join(terms)
+
+def apply(query, dialect: str, q: str):
+    """Restrict a Room query to full-text matches of q.
+    Returns (query, rank) where ordering by rank ascending puts the best match first."""
+    if dialect == "postgresql":
+        document = literal_column(TSVECTOR)
+        ts_query = func.websearch_to_tsquery("english", q)
+        return query.filter(document.op("@@")(ts_query)), -func.ts_rank(document, ts_query)
+
+    if dialect == "sqlite":
+        fts5_query = _fts5_query(q)
+        if not fts5_query:
+            return query.filter(false()), models.Room.id
+        matches = (
+            select(rooms_fts.c.rowid.label("room_id"), rooms_fts.c.rank.label("rank"))
+            .where(literal_column("rooms_fts").op("MATCH")(fts5_query))
+            .subquery()
+        )
+        return query.join(matches, matches.c.room_id == models.Room.id), matches.c.rank
+
+    # Unindexed fallback for other databases
+    pattern = f"%{q}%"
+    return query.filter(
+        models.Room.title.ilike(pattern)
+        | models.Room.description.ilike(pattern)
+        | models.Room.location.ilike(pattern)
+    ), models.Room.id
@@ -0,0 +1,171 @@
+"""
+Room image galleries and reference counts for content-addressed image files.
+A room's cover (Room.image_url) and each entry of its gallery (Room.images)
+hold one reference to their StoredImage row. Uploads register files with no
+references; gc_images.py deletes files whose count is zero once
+GRACE_PERIOD has passed since they were last uploaded or released. Counts are
+adjusted with in-place SQL increments so concurrent edits cannot lose updates.
+Legacy (non content-addressed) URLs are kept but not counted.
+
+Images are identified by file name, e.g. DELETE /rooms/5/images/<sha256>.jpg.
+None of these functions commit.
+"""
+import os
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import List
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+from . import models, images
+
+MAX_GALLERY_IMAGES = int(os.getenv("MAX_GALLERY_IMAGES", 30))
+GRACE_PERIOD = timedelta(hours=1)
+
+class GalleryError(Exception):
+    pass
+
+class ImageNotInGallery(GalleryError):
+    pass
+
+class ImageCollected(GalleryError):
+    def __init__(self):
+        super().__init__("The image was garbage-collected while it was being uploaded; upload it again")
+
+def image_id(url: str) -> str:
+    return url.rsplit("/", 1)[-1]
+
+def register(db: Session, image: images.SavedUpload):
+    """Record an uploaded file (no references yet) or refresh its last_seen_at"""
+    result = db.execute(
+        update(models.StoredImage)
+        .where(models.StoredImage.digest == image.digest)
+        .values(last_seen_at=datetime.utcnow())
+    )
+    if result.rowcount == 0:
+        try:
+            with db.begin_nested():
+                db.execute(insert(models.StoredImage).values(
+                    digest=image.digest,
+                    extension=image.extension,
+                    size_bytes=image.size_bytes,
+                    ref_count=0,
+                    last_seen_at=datetime.utcnow(),
+                ))
+        except IntegrityError:
+            pass  # registered concurrently by an identical upload
+    # The statements above wait for a concurrent gc_images.py deletion of this
+    # row to commit, and gc removes the files before committing; if it took
+    # the file this upload had just written, the upload has to be repeated
+    if not os.path.exists(images.stored_files(image.digest, image.extension)[0]):
+        raise ImageCollected()
+
+def _adjust(db: Session, url: str, delta: int):
+    digest = images.digest_from_url(url)
+    if digest:
+        db.execute(
+            update(models.StoredImage)
+            .where(models.StoredImage.digest == digest)
+            .values(ref_count=models.StoredImage.ref_count + delta, last_seen_at=datetime.utcnow())
+        )
+
+def retain(db: Session, url: str):
+    _adjust(db, url, +1)
+
+def release(db: Session, url: str):
+    _adjust(db, url, -1)
+
+def set_cover(db: Session, room: models.Room, image: images.SavedUpload):
+    register(db, image)
+    retain(db, image.url)
+    if room.image_url:
+        release(db, room.image_url)
+    room.image_url = image.url
+    room.thumbnail_url = image.thumbnail_url
+
+def add_images(db: Session, room: models.Room, uploads: List[images.SavedUpload]):
+    """Append uploads to the gallery; an image already in it is not added twice"""
+    gallery = list(room.images or [])
+    new_urls = []
+    for image in uploads:
+        if image.url not in gallery and image.url not in new_urls:
+            new_urls.append(image.url)
+    if len(gallery) + len(new_urls) > MAX_GALLERY_IMAGES:
+        raise GalleryError(f"A room can have at most {MAX_GALLERY_IMAGES} gallery images")
+    for image in uploads:
+        register(db, image)
+    for url in new_urls:
+        retain(db, url)
+    room.images = gallery + new_urls
+
+def remove_image(db: Session, room: models.Room, removed_id: str):
+    gallery = list(room.images or [])
+    remaining = [url for url in gallery if image_id(url) != removed_id]
+    if len(remaining) == len(gallery):
+        raise ImageNotInGallery("Image not found in this room's gallery")
+    for url in gallery:
+        if image_id(url) == removed_id:
+            release(db, url)
+    room.images = remaining
+
+def reorder_images(db: Session, room: models.Room, ordered_ids: List[str]):
+    """Reorder the gallery; ordered_ids must list every image exactly once"""
+    by_id = {image_id(url): url for url in room.images or []}
+    if sorted(ordered_ids) != sorted(by_id):
+        raise GalleryError("image_ids must list every gallery image exactly once")
+    room.images = [by_id[image] for image in ordered_ids]
+
+def recount_all(db: Session):
+    """Rebuild every ref_count from the rooms table (soft-deleted rooms included)"""
+    counts = Counter()
+    for cover, gallery in db.execute(select(models.Room.image_url, models.Room.images)):
+        for url in [cover, *(gallery or [])]:
+            digest = images.digest_from_url(url)
+            if digest:
+                counts[digest] += 1
+
+    known = set(db.execute(select(models.StoredImage.digest)).scalars())
+    db.execute(update(models.StoredImage).values(ref_count=0))
+    for digest, count in counts.items():
+        if digest in known:
+            db.execute(
+                update(models.StoredImage)
+                .where(models.StoredImage.digest == digest)
+                .values(ref_count=count)
+            )
+            continue
+        # Referenced file without a row (e.g. uploaded before reference counting)
+        for extension in ("jpg", "png", "webp"):
+            original_path = images.stored_files(digest, extension)[0]
+            if os.path.exists(original_path):
+                db.execute(insert(models.StoredImage).values(
+                    digest=digest,
+                    extension=extension,
+                    size_bytes=os.path.getsize(original_path),
+                    ref_count=count,
+                    last_seen_at=datetime.utcnow(),
+                ))
+                break
+
+def collectable(db: Session, now: datetime = None) -> List[models.StoredImage]:
+    cutoff = (now or datetime.utcnow()) - GRACE_PERIOD
+    return db.execute(
+        select(models.StoredImage).where(
+            models.StoredImage.ref_count <= 0,
+            models.StoredImage.last_seen_at < cutoff
+        )
+    ).scalars().all()
+
+def forget(db: Session, stored: models.StoredImage, now: datetime = None) -> bool:
+    """Delete the row if it is still unreferenced; True when its files may be
+    removed. Remove them before committing, so that an upload registering the
+    same image waits for the removal (see register)."""
+    cutoff = (now or datetime.utcnow()) - GRACE_PERIOD
+    result = db.execute(
+        delete(models.StoredImage).where(
+            models.StoredImage.digest == stored.digest,
+            models.StoredImage.ref_count <= 0,
+            models.StoredImage.last_seen_at < cutoff
+        )
+    )
+    return result.rowcount == 1
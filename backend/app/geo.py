@@ -0,0 +1,97 @@
+"""
+Geohash grid for map search.
+Rooms store a geohash of their coordinates in an indexed column; a map query is
+answered by range scans over the handful of geohash cells covering the search
+box, then exact distances are computed in-process for those candidates only.
+Rooms.geohash uses binary ("C") ordering so a cell prefix maps to one index range.
+"""
+import math
+from typing import List, Optional, Tuple
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+PRECISION = 9  # ~5m cells; stored on every room
+MAX_COVER_CELLS = 16
+EARTH_RADIUS_KM = 6371.0088
+
+BoundingBox = Tuple[float, float, float, float]  # (min_lat, min_lng, max_lat, max_lng)
+
+def encode(latitude: float, longitude: float, precision: int = PRECISION) -> str:
+    lat_range = [-90.0, 90.0]
+    lng_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    value = 0
+    even = True
+    while len(chars) < precision:
+        interval, coordinate = (lng_range, longitude) if even else (lat_range, latitude)
+        mid = (interval[0] + interval[1]) / 2
+        value <<= 1
+        if coordinate >= mid:
+            value |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bits += 1
+        if bits == 5:
+            chars.append(BASE32[value])
+            bits = 0
+            value = 0
+    return "".join(chars)
+
+def cell_size(precision: int) -> Tuple[float, float]:
+    """(lat degrees, lng degrees) covered by one cell"""
+    total_bits = 5 * precision
+    lng_bits = (total_bits + 1) // 2
+    lat_bits = total_bits // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lng_bits)
+
+def cover(box: BoundingBox, max_cells: int = MAX_COVER_CELLS) -> List[str]:
+    """Smallest set of equal-precision cells covering the box, at the finest
+    precision that needs no more than max_cells cells"""
+    min_lat, min_lng, max_lat, max_lng = box
+    for precision in range(PRECISION, 0, -1):
+        cell_lat, cell_lng = cell_size(precision)
+        rows = math.floor(max_lat / cell_lat) - math.floor(min_lat / cell_lat) + 1
+        cols = math.floor(max_lng / cell_lng) - math.floor(min_lng / cell_lng) + 1
+        if rows * cols <= max_cells:
+            break
+    cells = set()
+    for row in range(rows):
+        latitude = min(min_lat + row * cell_lat, max_lat)
+        for col in range(cols):
+            longitude = min(min_lng + col * cell_lng, max_lng)
+            cells.add(encode(latitude, longitude, precision))
+    return sorted(cells)
+
+def prefix_range(prefix: str) -> Tuple[str, str]:
+    """[low, high) string bounds matching every geohash starting with prefix"""
+    return prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+def haversine_km(lat1: float, lng1: float, lat2: float, lng2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lng2 - lng1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+def box_around(latitude: float, longitude: float, radius_km: float) -> BoundingBox:
+    d_lat = math.degrees(radius_km / EARTH_RADIUS_KM)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lng = min(180.0, math.degrees(radius_km / (EARTH_RADIUS_KM * cos_lat)))
+    return (
+        max(-90.0, latitude - d_lat),
+        max(-180.0, longitude - d_lng),
+        min(90.0, latitude + d_lat),
+        min(180.0, longitude + d_lng),
+    )
+
+def parse_bbox(value: str) -> Optional[BoundingBox]:
+    """Parse "west,south,east,north" (Leaflet toBBoxString order)"""
+    try:
+        west, south, east, north = (float(part) for part in value.split(","))
+    except ValueError:
+        return None
+    if not (-90 <= south <= north <= 90 and -180 <= west <= east <= 180):
+        return None
+    return south, west, north, east
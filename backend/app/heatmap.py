@@ -0,0 +1,91 @@
+"""
+Availability heatmap: nightly availability and price of many rooms over a date
+window, for multi-property calendar views.
+Three queries whatever the number of rooms and days (rooms, calendar ranges,
+bookings), merged in memory into a columnar result: entry i of every list
+describes room_ids[i]. Per-day flags are bitsets, base64 encoded, where bit d
+(byte d // 8, least significant bit first) is the night of start_date + d.
+"""
+import base64
+from datetime import date, timedelta
+from typing import Dict, List
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from . import models, host_calendar, inventory
+
+MAX_ROOMS = 200
+MAX_DAYS = 366
+
+def encode_bits(bits: int, days: int) -> str:
+    return base64.b64encode(bits.to_bytes((days + 7) // 8, "little")).decode()
+
+def _span_bits(window_start: date, days: int, start: date, end: date) -> int:
+    """Bits of the days start..end (inclusive) that fall inside the window"""
+    first = max((start - window_start).days, 0)
+    last = min((end - window_start).days, days - 1)
+    if last < first:
+        return 0
+    return ((1 << (last - first + 1)) - 1) << first
+
+def build(rooms, range_rows, booking_rows, start_date: date, end_date: date) -> Dict:
+    """Assemble the heatmap from already-loaded rows (no database access).
+    rooms: Room rows in output order; range_rows: calendar ranges; booking_rows:
+    (room_id, start_date, end_date) of bookings."""
+    days = (end_date - start_date).days + 1
+    full = (1 << days) - 1
+    booked = {room.id: 0 for room in rooms}
+    blocked = {room.id: 0 for room in rooms}
+    prices = {room.id: [room.price] * days for room in rooms}
+
+    for row in range_rows:
+        if row.room_id not in prices:
+            continue
+        if not row.is_available:
+            blocked[row.room_id] |= _span_bits(start_date, days, row.start_date, row.end_date)
+        if row.price_override is not None:
+            first = max((row.start_date - start_date).days, 0)
+            last = min((row.end_date - start_date).days, days - 1)
+            prices[row.room_id][first:last + 1] = [row.price_override] * (last - first + 1)
+
+    for room_id, booking_start, booking_end in booking_rows:
+        if room_id in booked:
+            last_night = booking_end.date() - timedelta(days=1)
+            booked[room_id] |= _span_bits(start_date, days, booking_start.date(), last_night)
+
+    available = {
+        room.id: (full & ~booked[room.id] & ~blocked[room.id]) if room.is_available else 0
+        for room in rooms
+    }
+    return {
+        "start_date": start_date,
+        "end_date": end_date,
+        "days": days,
+        "room_ids": [room.id for room in rooms],
+        "base_prices": [room.price for room in rooms],
+        "available": [encode_bits(available[room.id], days) for room in rooms],
+        "booked": [encode_bits(booked[room.id], days) for room in rooms],
+        "blocked": [encode_bits(blocked[room.id], days) for room in rooms],
+        "prices": [prices[room.id] for room in rooms],
+    }
+
+async def heatmap(db: AsyncSession, room_ids: List[int], start_date: date, end_date: date) -> Dict:
+    """Heatmap of the existing, non-deleted rooms among room_ids (in request
+    order) for the days start_date..end_date inclusive"""
+    found = {
+        room.id: room
+        for room in (await db.execute(
+            select(models.Room.id, models.Room.price, models.Room.is_available).where(
+                models.Room.id.in_(room_ids),
+                models.Room.is_deleted == False
+            )
+        )).all()
+    }
+    rooms = [found[room_id] for room_id in dict.fromkeys(room_ids) if room_id in found]
+    if not rooms:
+        return build([], [], [], start_date, end_date)
+    ids = [room.id for room in rooms]
+    range_rows = (await db.execute(host_calendar.ranges_query(ids, start_date, end_date))).all()
+    booking_rows = (await db.execute(
+        inventory.bookings_between(ids, start_date, end_date + timedelta(days=1))
+    )).all()
+    return build(rooms, range_rows, booking_rows, start_date, end_date)
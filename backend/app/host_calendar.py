@@ -0,0 +1,218 @@
+"""
+Host calendar stored as run-length encoded ranges.
+A RoomAvailabilityRange row covers an inclusive [start_date, end_date] run of
+days sharing is_available / price_override / notes. A room's ranges never
+overlap and adjacent ranges with identical values are merged, so a season
+blocked or repriced in one go is one row. Days outside every range are
+available at Room.price.
+
+A change blocks/unblocks and/or reprices an inclusive date range for many rooms
+at once. Only the fields a change sets are written; fields it leaves out keep
+their current value on days already in a range and their defaults on the rest.
+Writes load the affected ranges of every room in one query, apply the changes
+in memory and replace only the rows that changed (one DELETE, one INSERT).
+
+Reads return ranges clipped to the requested window; expand() turns them into
+per-day views for callers that want days. None of these functions commit;
+writers hold inventory.rooms_lock until they do.
+"""
+from datetime import date, timedelta
+from itertools import groupby
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from sqlalchemy import delete, insert, select
+from sqlalchemy.orm import Session
+from . import models
+
+MAX_RANGE_DAYS = 731
+FIELDS = ("is_available", "price_override", "notes")
+DEFAULT_STATE = (True, None, None)
+ONE_DAY = timedelta(days=1)
+
+class CalendarChange(NamedTuple):
+    start_date: date
+    end_date: date  # inclusive
+    fields: dict  # subset of is_available / price_override / notes
+
+class Segment(NamedTuple):
+    start_date: date
+    end_date: date  # inclusive
+    is_available: bool
+    price_override: Optional[float]
+    notes: Optional[str]
+
+    @property
+    def state(self) -> tuple:
+        return self[2:]
+
+class InvalidChange(Exception):
+    pass
+
+def days(start_date: date, end_date: date) -> List[date]:
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days + 1)]
+
+def validate(change: CalendarChange):
+    if change.end_date < change.start_date:
+        raise InvalidChange("end_date must not be before start_date")
+    if (change.end_date - change.start_date).days + 1 > MAX_RANGE_DAYS:
+        raise InvalidChange(f"A change can cover at most {MAX_RANGE_DAYS} days")
+    if not change.fields:
+        raise InvalidChange("A change must set is_available, price_override or notes")
+
+def merge(segments: Iterable[Segment]) -> List[Segment]:
+    """Join adjacent segments with the same state; input sorted and non-overlapping"""
+    merged = []
+    for segment in segments:
+        previous = merged[-1] if merged else None
+        if previous and previous.end_date + ONE_DAY == segment.start_date and previous.state == segment.state:
+            merged[-1] = previous._replace(end_date=segment.end_date)
+        else:
+            merged.append(segment)
+    return merged
+
+def _changed(state: tuple, fields: dict) -> tuple:
+    return tuple(fields.get(field, value) for field, value in zip(FIELDS, state))
+
+def apply_change(segments: List[Segment], change: CalendarChange) -> List[Segment]:
+    """One room's sorted, non-overlapping segments with the change applied"""
+    start, end = change.start_date, change.end_date
+    pieces = []
+    cursor = start  # first day of the change not yet covered
+    for segment in segments:
+        if segment.end_date < start or segment.start_date > end:
+            pieces.append(segment)
+            continue
+        overlap_start = max(segment.start_date, start)
+        overlap_end = min(segment.end_date, end)
+        if segment.start_date < start:
+            pieces.append(segment._replace(end_date=start - ONE_DAY))
+        if cursor < overlap_start:
+            pieces.append(Segment(cursor, overlap_start - ONE_DAY, *_changed(DEFAULT_STATE, change.fields)))
+        pieces.append(Segment(overlap_start, overlap_end, *_changed(segment.state, change.fields)))
+        if segment.end_date > end:
+            pieces.append(segment._replace(start_date=end + ONE_DAY))
+        cursor = overlap_end + ONE_DAY
+    if cursor <= end:
+        pieces.append(Segment(cursor, end, *_changed(DEFAULT_STATE, change.fields)))
+    return merge(sorted(pieces))
+
+def compress(day_rows: Iterable[tuple]) -> Iterator[Tuple[int, Segment]]:
+    """Run-length encode (room_id, date, is_available, price_override, notes) rows
+    ordered by room_id and date; the first row of a repeated day wins"""
+    for room_id, rows in groupby(day_rows, key=lambda row: row[0]):
+        segments = []
+        for _, day, is_available, price_override, notes in rows:
+            if segments and segments[-1].start_date == day:
+                continue
+            segments.append(Segment(day, day, is_available is not False, price_override, notes))
+        for segment in merge(segments):
+            yield room_id, segment
+
+def ranges_query(room_ids: Iterable[int], start_date: date, end_date: date):
+    """Stored ranges of the rooms that overlap [start_date, end_date], in calendar order"""
+    ranges = models.RoomAvailabilityRange
+    return select(
+        ranges.id,
+        ranges.room_id,
+        ranges.start_date,
+        ranges.end_date,
+        ranges.is_available,
+        ranges.price_override,
+        ranges.notes,
+        ranges.created_at
+    ).where(
+        ranges.room_id.in_(list(room_ids)),
+        ranges.start_date <= end_date,
+        ranges.end_date >= start_date
+    ).order_by(ranges.room_id, ranges.start_date)
+
+def _segment(row) -> Segment:
+    return Segment(row.start_date, row.end_date, row.is_available, row.price_override, row.notes)
+
+def apply(db: Session, room_ids: Iterable[int], changes: List[CalendarChange]) -> int:
+    """Apply changes in order (later ones win where they overlap); returns the
+    number of room-days written"""
+    for change in changes:
+        validate(change)
+    room_ids = sorted(set(room_ids))
+    if not room_ids or not changes:
+        return 0
+
+    # Neighbouring ranges are loaded too so they can merge with the changes
+    span_start = min(change.start_date for change in changes) - ONE_DAY
+    span_end = max(change.end_date for change in changes) + ONE_DAY
+    stored = {room_id: {} for room_id in room_ids}
+    for row in db.execute(ranges_query(room_ids, span_start, span_end)):
+        stored[row.room_id][_segment(row)] = row.id
+
+    results = {}
+    for room_id, before in stored.items():
+        after = list(before)
+        for change in changes:
+            after = apply_change(after, change)
+        results[room_id] = after
+    _replace(db, stored, results)
+    return len(room_ids) * sum(len(days(change.start_date, change.end_date)) for change in changes)
+
+def _replace(db: Session, stored: dict, results: dict) -> int:
+    """Write each room's new segments over its stored ones ({segment: range id}),
+    touching only the rows that differ; returns the number of rows inserted"""
+    removed, added = [], []
+    for room_id, after in results.items():
+        before = stored[room_id]
+        kept = set(after)
+        removed.extend(range_id for segment, range_id in before.items() if segment not in kept)
+        added.extend({"room_id": room_id, **segment._asdict()} for segment in after if segment not in before)
+    if removed:
+        db.execute(delete(models.RoomAvailabilityRange).where(models.RoomAvailabilityRange.id.in_(removed)))
+    if added:
+        db.execute(insert(models.RoomAvailabilityRange), added)
+    return len(added)
+
+def underlay(db: Session, room_id: int, segments: List[Segment]) -> int:
+    """Lay sorted segments under a room's stored ranges: days already in a range
+    keep it, the other days take the segments. Returns the number of rows inserted."""
+    if not segments:
+        return 0
+    stored = {
+        _segment(row): row.id
+        for row in db.execute(ranges_query([room_id], segments[0].start_date - ONE_DAY, segments[-1].end_date + ONE_DAY))
+    }
+    after = list(segments)
+    for segment in stored:
+        after = apply_change(after, CalendarChange(segment.start_date, segment.end_date, dict(zip(FIELDS, segment.state))))
+    return _replace(db, {room_id: stored}, {room_id: after})
+
+def clip(rows, start_date: date, end_date: date) -> Iterator[dict]:
+    """Stored ranges cut down to the window"""
+    for row in rows:
+        yield {
+            "start_date": max(row.start_date, start_date),
+            "end_date": min(row.end_date, end_date),
+            "is_available": row.is_available,
+            "price_override": row.price_override,
+            "notes": row.notes,
+        }
+
+def expand(rows, start_date: date, end_date: date) -> Iterator[dict]:
+    """Per-day views of the stored ranges within the window; `id` is the range's"""
+    for row in rows:
+        for day in days(max(row.start_date, start_date), min(row.end_date, end_date)):
+            yield {
+                "id": row.id,
+                "room_id": row.room_id,
+                "date": day,
+                "is_available": row.is_available,
+                "price_override": row.price_override,
+                "notes": row.notes,
+                "created_at": row.created_at,
+            }
+
+def existing_days(db: Session, room_id: int, start_date: date, end_date: date) -> int:
+    """Days of the window already covered by a stored range"""
+    return sum(
+        (min(row.end_date, end_date) - max(row.start_date, start_date)).days + 1
+        for row in db.execute(ranges_query([room_id], start_date, end_date))
+    )
+
+def get_day(db: Session, room_id: int, day: date) -> Optional[dict]:
+    return next(expand(db.execute(ranges_query([room_id], day, day)), day, day), None)
@@ -0,0 +1,241 @@
+"""
+Room image upload pipeline.
+Uploads are streamed to disk in chunks (never held in memory, never written on
+the event loop), checked against a size cap and by magic bytes rather than
+the client's filename, then resized on a worker pool into WebP and JPEG
+variants.
+
+Files are content-addressed: an upload is stored as <sha256>.<ext> with
+variants <sha256>_<name>.webp / .jpg for each name in VARIANTS, so the same
+photo uploaded twice is stored (and resized) once. Names never change meaning,
+which lets them be served as immutable. References from rooms are counted in
+StoredImage rows (see gallery.py) and gc_images.py removes files nobody
+references.
+"""
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.staticfiles import StaticFiles
+from PIL import Image, ImageOps
+
+IMAGEDIR = "static/images/"
+# New uploads are served by routers/media.py (format negotiation, ETags);
+# older rows still hold URLs under the /static mount
+URL_PREFIX = "/images/"
+STATIC_URL_PREFIX = "/static/images/"
+
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 10 * 1024 * 1024))
+CHUNK_SIZE = 1024 * 1024
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", 2))
+# Refuse decompression bombs: a small file can still decode to a huge bitmap
+Image.MAX_IMAGE_PIXELS = int(os.getenv("MAX_IMAGE_PIXELS", 50_000_000))
+
+# variant name -> bounding width in pixels (never upscaled)
+VARIANTS = {
+    "thumb": 320,
+    "card": 640,
+    "large": 1280,
+}
+# Written for every upload; JPEG is the universal fallback
+VARIANT_FORMATS = ("webp", "jpg")
+# Only written by generate_image_variants.py (slow to encode)
+OFFLINE_FORMATS = ("avif",)
+# Shown on listing cards
+THUMBNAIL_VARIANT = "card"
+WEBP_QUALITY = 80
+JPEG_QUALITY = 82
+AVIF_QUALITY = 60
+
+# Content-addressed files never change, so caches never need to revalidate them
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Pillow releases the GIL while decoding, resizing and encoding
+_executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix="images")
+
+class InvalidImage(Exception):
+    pass
+
+class ImageTooLarge(Exception):
+    def __init__(self):
+        super().__init__(f"Image exceeds the {MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit")
+
+# Content-addressed file names: <digest>.<ext> and <digest>_<variant>.<ext>
+CONTENT_NAME = re.compile(r"^([0-9a-f]{64})(?:_[a-z]+)?\.(jpg|png|webp|avif)$")
+
+class SavedUpload(NamedTuple):
+    """A content-addressed file written by save_upload (its row is models.StoredImage)"""
+    digest: str
+    extension: str
+    size_bytes: int
+    url: str
+    thumbnail_url: str
+    variants: Dict[str, Dict[str, str]]  # name -> {format: url} for VARIANT_FORMATS
+
+def sniff_extension(header: bytes) -> str:
+    """File extension for the image type the leading bytes identify"""
+    if header.startswith(b"\xff\xd8\xff"):
+        return "jpg"
+    if header.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "png"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "webp"
+    raise InvalidImage("Unsupported image type (use JPEG, PNG or WebP)")
+
+def variant_path(original_path: str, name: str, extension: str) -> str:
+    stem = os.path.splitext(original_path)[0]
+    return f"{stem}_{name}.{extension}"
+
+def open_image(path: str) -> Image.Image:
+    """Decode, apply EXIF orientation and normalize to RGB/RGBA"""
+    try:
+        with Image.open(path) as source:
+            source.load()
+            image = ImageOps.exif_transpose(source)
+    except (OSError, Image.DecompressionBombError) as e:
+        raise InvalidImage("Could not decode image") from e
+
+    if image.mode not in ("RGB", "RGBA"):
+        has_alpha = "A" in image.getbands() or "transparency" in image.info
+        image = image.convert("RGBA" if has_alpha else "RGB")
+    return image
+
+def save_as(image: Image.Image, path: str, extension: str):
+    if extension == "webp":
+        image.save(path, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif extension == "avif":
+        image.save(path, "AVIF", quality=AVIF_QUALITY)
+    else:
+        image.convert("RGB").save(path, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+
+def make_variants(original_path: str, formats=VARIANT_FORMATS, skip_existing: bool = False) -> int:
+    """Write the variants of an original (runs on the worker pool); returns how many were written"""
+    image = open_image(original_path)
+    written = 0
+    for name, width in VARIANTS.items():
+        paths = {ext: variant_path(original_path, name, ext) for ext in formats}
+        if skip_existing:
+            paths = {ext: path for ext, path in paths.items() if not os.path.exists(path)}
+        if not paths:
+            continue
+        resized = image.copy()
+        resized.thumbnail((width, width * 4), Image.Resampling.LANCZOS)
+        for ext, path in paths.items():
+            save_as(resized, path, ext)
+            written += 1
+    return written
+
+def _remove(*paths: str):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+def to_url(path: str) -> str:
+    return URL_PREFIX + os.path.basename(path)
+
+def digest_from_url(url: str):
+    """Digest of a content-addressed image URL, None for anything else (legacy uploads)"""
+    for prefix in (URL_PREFIX, STATIC_URL_PREFIX):
+        if url and url.startswith(prefix):
+            match = CONTENT_NAME.match(url[len(prefix):])
+            return match[1] if match else None
+    return None
+
+def variant_paths(original_path: str, formats=VARIANT_FORMATS):
+    return [variant_path(original_path, name, ext) for name in VARIANTS for ext in formats]
+
+def sibling_paths(original_path: str):
+    """Full-size re-encodings of an original, written by generate_image_variants.py"""
+    stem, extension = os.path.splitext(original_path)
+    return [f"{stem}.{ext}" for ext in ("webp",) + OFFLINE_FORMATS if f".{ext}" != extension]
+
+def stored_files(digest: str, extension: str):
+    """Paths of an original and every variant it may have"""
+    original_path = os.path.join(IMAGEDIR, f"{digest}.{extension}")
+    return [original_path] + sibling_paths(original_path) + variant_paths(original_path, VARIANT_FORMATS + OFFLINE_FORMATS)
+
+def _open_partial(partial_path: str):
+    os.makedirs(IMAGEDIR, exist_ok=True)
+    return open(partial_path, "wb")
+
+def _publish(partial_path: str, original_path: str) -> bool:
+    """Move a finished upload to its content address; True when the variants
+    of an earlier copy are all still there and can be reused"""
+    reused = all(os.path.exists(path) for path in variant_paths(original_path))
+    # Same content, same name: replacing an existing copy is harmless and
+    # guarantees the file is present even if a collection just removed it
+    os.replace(partial_path, original_path)
+    if reused:
+        try:
+            for path in variant_paths(original_path):
+                os.utime(path)  # keep reused variants out of gc_images.py's orphan sweep
+        except FileNotFoundError:
+            reused = False
+    return reused
+
+async def save_upload(file: UploadFile) -> SavedUpload:
+    """Stream an upload to IMAGEDIR and generate its variants.
+    Raises InvalidImage or ImageTooLarge; nothing is left on disk in that case."""
+    partial_path = os.path.join(IMAGEDIR, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    size = 0
+    extension = None
+    out = await run_in_threadpool(_open_partial, partial_path)
+    try:
+        while True:
+            chunk = await file.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            if extension is None:
+                extension = sniff_extension(chunk[:16])
+            size += len(chunk)
+            if size > MAX_UPLOAD_BYTES:
+                raise ImageTooLarge()
+            digest.update(chunk)
+            await run_in_threadpool(out.write, chunk)
+        if extension is None:
+            raise InvalidImage("Empty upload")
+    except BaseException:
+        await run_in_threadpool(out.close)
+        await run_in_threadpool(_remove, partial_path)
+        raise
+    await run_in_threadpool(out.close)
+
+    digest = digest.hexdigest()
+    original_path, *_ = stored_files(digest, extension)
+    reused = await run_in_threadpool(_publish, partial_path, original_path)
+    if not reused:
+        try:
+            await asyncio.get_running_loop().run_in_executor(_executor, make_variants, original_path)
+        except BaseException:
+            await run_in_threadpool(_remove, *stored_files(digest, extension))
+            raise
+
+    variants = {
+        name: {ext: to_url(variant_path(original_path, name, ext)) for ext in VARIANT_FORMATS}
+        for name in VARIANTS
+    }
+    return SavedUpload(
+        digest=digest,
+        extension=extension,
+        size_bytes=size,
+        url=to_url(original_path),
+        # The JPEG URL: the image route upgrades it to AVIF/WebP per Accept
+        thumbnail_url=variants[THUMBNAIL_VARIANT]["jpg"],
+        variants=variants,
+    )
+
+class ImageStaticFiles(StaticFiles):
+    """StaticFiles that marks content-addressed images immutable"""
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        if CONTENT_NAME.match(os.path.basename(full_path)):
+            response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
@@ -0,0 +1,114 @@
+"""
+Room inventory checks shared by room search and booking.
+A stay covers the nights [start_date, end_date): checking out on a date
+does not conflict with another guest checking in on that date.
+"""
+import threading
+from contextlib import ExitStack, contextmanager
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import and_, exists, or_, select
+from sqlalchemy.orm import Session
+from . import models
+
+class BookingConflict(Exception):
+    """The room is already booked or blocked for some of the requested nights"""
+    def __init__(self, message: str = "Room is not available for the selected dates"):
+        super().__init__(message)
+
+def night_bounds(start_date: date, end_date: date):
+    """DateTime bounds such that a booking overlaps the nights iff
+    booking.start_date < upper and booking.end_date >= lower"""
+    lower = datetime.combine(start_date + timedelta(days=1), time.min)
+    upper = datetime.combine(end_date, time.min)
+    return lower, upper
+
+def overlapping_bookings(room_id, start_date: date, end_date: date, exclude_booking_id: int = None):
+    """Non-cancelled bookings of room_id that share at least one night with the stay"""
+    lower, upper = night_bounds(start_date, end_date)
+    query = select(models.Booking.id).where(
+        models.Booking.room_id == room_id,
+        models.Booking.start_date < upper,
+        models.Booking.end_date >= lower,
+        models.Booking.status != "cancelled"
+    )
+    if exclude_booking_id is not None:
+        query = query.where(models.Booking.id != exclude_booking_id)
+    return query
+
+def bookings_between(room_ids, start_date: date, end_date: date):
+    """(room_id, start_date, end_date) of the non-cancelled bookings of several
+    rooms sharing a night with [start_date, end_date). A booking occupies the
+    nights [booking.start_date.date(), booking.end_date.date())."""
+    lower, upper = night_bounds(start_date, end_date)
+    return select(models.Booking.room_id, models.Booking.start_date, models.Booking.end_date).where(
+        models.Booking.room_id.in_(list(room_ids)),
+        models.Booking.start_date < upper,
+        models.Booking.end_date >= lower,
+        models.Booking.status != "cancelled"
+    )
+
+def blocked_nights(room_id, start_date: date, end_date: date):
+    """Blocked calendar ranges of room_id sharing a night with the stay"""
+    return select(models.RoomAvailabilityRange.id).where(
+        models.RoomAvailabilityRange.room_id == room_id,
+        models.RoomAvailabilityRange.start_date < end_date,
+        models.RoomAvailabilityRange.end_date >= start_date,
+        models.RoomAvailabilityRange.is_available == False
+    )
+
+def free_between(start_date: date, end_date: date):
+    """Correlated filter for Room queries: no overlapping booking and no blocked night"""
+    return and_(
+        models.Room.is_available == True,
+        ~exists(overlapping_bookings(models.Room.id, start_date, end_date)),
+        ~exists(blocked_nights(models.Room.id, start_date, end_date))
+    )
+
+def has_conflict(db: Session, room_id: int, start_date: date, end_date: date, exclude_booking_id: int = None) -> bool:
+    """One indexed round trip: any overlapping booking or blocked night for the stay"""
+    return has_conflict_in(db, room_id, [(start_date, end_date)], exclude_booking_id)
+
+def has_conflict_in(db: Session, room_id: int, windows, exclude_booking_id: int = None) -> bool:
+    """has_conflict over several [start_date, end_date) windows, still one round trip"""
+    checks = []
+    for start_date, end_date in windows:
+        checks.append(exists(overlapping_bookings(room_id, start_date, end_date, exclude_booking_id)))
+        checks.append(exists(blocked_nights(room_id, start_date, end_date)))
+    if not checks:
+        return False
+    return db.execute(select(or_(*checks))).scalar()
+
+# SQLite has no row locks; reservations for the same room are serialized
+# in-process instead (SQLite deployments run a single worker). Rooms share a
+# fixed set of lock stripes, so the locks do not grow with the number of rooms.
+LOCK_STRIPES = 256
+_room_locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+
+@contextmanager
+def rooms_lock(db: Session, room_ids):
+    """Hold exclusive locks on several rooms, taken in id order so that
+    overlapping lock sets cannot deadlock (see reservation_lock)"""
+    room_ids = sorted(set(room_ids))
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(
+            select(models.Room.id).where(models.Room.id.in_(room_ids)).order_by(models.Room.id).with_for_update()
+        )
+        yield
+    else:
+        with ExitStack() as stack:
+            # Each stripe once and in stripe order: two rooms may share one
+            for stripe in sorted({room_id % LOCK_STRIPES for room_id in room_ids}):
+                stack.enter_context(_room_locks[stripe])
+            yield
+
+@contextmanager
+def reservation_lock(db: Session, room_id: int):
+    """Hold an exclusive lock on one room for a check-then-write reservation.
+
+    On PostgreSQL this is a row lock on the room (SELECT ... FOR UPDATE) that
+    lasts until the session commits or rolls back, so reservations for
+    different rooms never wait on each other. The caller must commit inside
+    the block. Host calendar writes take the same lock.
+    """
+    with rooms_lock(db, [room_id]):
+        yield
@@ -1,14 +1,20 @@
+import asyncio
 from fastapi import FastAPI
-from fastapi.staticfiles import StaticFiles
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base
-from .routers import auth, users, rooms, bookings, reviews, booking_modifications, availability
+from .database import engine, Base, SessionLocal
+from .routers import auth, users, rooms, bookings, reviews, booking_modifications, availability, search, metrics, media, analytics
+from . import suggest, fulltext, response_cache, images
 
 # Create Tables
 Base.metadata.create_all(bind=engine)
+fulltext.ensure_index(engine)
 
 app = FastAPI(title="Hotel Management System API")
 
+# Added before CORS so cached responses still get CORS headers
+app.add_middleware(response_cache.ResponseCacheMiddleware)
+
 # CORS
 origins = [
     "http://localhost",
@@ -21,6 +27,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "ETag"],
 )
 
 # Static Files for Images
@@ -34,7 +41,7 @@ import os
 backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__))) # backend/
 static_dir = os.path.join(backend_dir, "static")
 
-app.mount("/static", StaticFiles(directory=static_dir), name="static")
+app.mount("/static", images.ImageStaticFiles(directory=static_dir), name="static")
 
 app.include_router(auth.router)
 app.include_router(users.router)
@@ -45,6 +52,30 @@ app.include_router(bookings.router)
 app.include_router(reviews.router)
 app.include_router(booking_modifications.router)
 app.include_router(availability.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(media.router)
+app.include_router(analytics.router)
+
+def rebuild_suggest_index():
+    db = SessionLocal()
+    try:
+        suggest.rebuild(db)
+    finally:
+        db.close()
+
+async def refresh_suggest_index():
+    while True:
+        await asyncio.sleep(suggest.REFRESH_SECONDS)
+        try:
+            await run_in_threadpool(rebuild_suggest_index)
+        except Exception as e:
+            print(f"Error refreshing search suggestions: {e}")
+
+@app.on_event("startup")
+async def build_suggest_index():
+    await run_in_threadpool(rebuild_suggest_index)
+    app.state.suggest_refresh = asyncio.create_task(refresh_suggest_index())
 
 @app.get("/")
 def read_root():
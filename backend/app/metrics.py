@@ -0,0 +1,63 @@
+"""
+In-process runtime metrics served by GET /api/metrics.
+Modules register a named section (a callable returning a dict); counters are
+per worker process and reset on restart.
+"""
+import threading
+from collections import deque
+from typing import Callable, Dict
+
+SAMPLE_SIZE = 2048
+
+_sections: Dict[str, Callable[[], dict]] = {}
+
+def register(name: str, collect: Callable[[], dict]):
+    _sections[name] = collect
+
+def snapshot() -> dict:
+    return {name: collect() for name, collect in _sections.items()}
+
+class Timer:
+    """Count, total and max of observed durations, plus percentiles over the
+    most recent SAMPLE_SIZE observations"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=SAMPLE_SIZE)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = sorted(self._samples)
+            count, total, longest = self.count, self.total, self.max
+
+        def percentile(fraction):
+            if not samples:
+                return 0.0
+            return round(samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000, 3)
+
+        return {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 3) if count else 0.0,
+            "p50_ms": percentile(0.50),
+            "p95_ms": percentile(0.95),
+            "p99_ms": percentile(0.99),
+            "max_ms": round(longest * 1000, 3),
+        }
+
+class Counter:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.value = 0
+
+    def add(self, amount: int = 1):
+        with self._lock:
+            self.value += amount
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, Text, JSON, Date, Enum
+from sqlalchemy import Column, Integer, String, Boolean, ForeignKey, Float, DateTime, Text, JSON, Date, Enum, Index
 from sqlalchemy.orm import relationship
 from .database import Base
 from datetime import datetime
@@ -26,11 +26,15 @@ class Room(Base):
     # Pricing
     price = Column(Float, nullable=False) # Per night price
     original_price = Column(Float, nullable=True) # Original/MRP price
+    weekly_discount = Column(Float, nullable=True) # % off stays of 7+ nights
+    monthly_discount = Column(Float, nullable=True) # % off stays of 28+ nights
     
     # Location
     location = Column(String, nullable=True)
     latitude = Column(Float, nullable=True)  # For map-based discovery
     longitude = Column(Float, nullable=True)
+    # Geohash of (latitude, longitude) for map search, see geo.py
+    geohash = Column(String(12).with_variant(String(12, collation="C"), "postgresql"), nullable=True, index=True)
     
     # Property Details
     property_type = Column(String, nullable=True, default="room") # house, apartment, room, guest_house
@@ -51,19 +55,86 @@ class Room(Base):
     
     # Images
     image_url = Column(String, nullable=True)
+    thumbnail_url = Column(String, nullable=True) # Resized WebP of image_url for listing cards
     images = Column(JSON, nullable=True, default=list) # Array of image URLs
     
     # Status
     is_available = Column(Boolean, default=True)
     is_deleted = Column(Boolean, default=False)
     
+    # Ratings (denormalized from RoomRatingStats, see ratings.py)
+    average_rating = Column(Float, nullable=False, default=0.0, server_default="0")
+    review_count = Column(Integer, nullable=False, default=0, server_default="0")
+    
     # Host
     host_id = Column(Integer, ForeignKey("users.id"), nullable=True)
     host = relationship("User", foreign_keys=[host_id])
 
     bookings = relationship("Booking", back_populates="room")
     reviews = relationship("Review", back_populates="room")
-    availability = relationship("RoomAvailability", back_populates="room")
+    availability = relationship("RoomAvailabilityRange", back_populates="room")
+    rating_stats = relationship("RoomRatingStats", uselist=False)
+
+    @property
+    def rating_histogram(self):
+        stats = self.rating_stats
+        return {str(stars): (getattr(stats, f"stars_{stars}") if stats else 0) for stars in range(1, 6)}
+
+    __table_args__ = (
+        # Keyset pagination indexes, one per sort order offered by GET /rooms/
+        Index("ix_rooms_listing_price", "is_deleted", "price", "id"),
+        Index("ix_rooms_listing_rating", "is_deleted", "average_rating", "id"),
+    )
+
+class StoredImage(Base):
+    """A content-addressed image file and the number of room references to it (see gallery.py)"""
+    __tablename__ = "stored_images"
+
+    digest = Column(String(64), primary_key=True) # sha256 of the original, also its file name
+    extension = Column(String(8), nullable=False)
+    size_bytes = Column(Integer, nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, server_default="0")
+    last_seen_at = Column(DateTime, nullable=False, default=datetime.utcnow) # last upload or reference change
+
+class RoomRatingStats(Base):
+    """Per-room histogram of approved review ratings, maintained incrementally"""
+    __tablename__ = "room_rating_stats"
+
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    stars_1 = Column(Integer, nullable=False, default=0)
+    stars_2 = Column(Integer, nullable=False, default=0)
+    stars_3 = Column(Integer, nullable=False, default=0)
+    stars_4 = Column(Integer, nullable=False, default=0)
+    stars_5 = Column(Integer, nullable=False, default=0)
+
+class RoomDailyStats(Base):
+    """Per-room, per-day booking rollup behind the analytics endpoints, maintained incrementally"""
+    __tablename__ = "room_daily_stats"
+
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    day = Column(Date, primary_key=True)
+    nights_sold = Column(Integer, nullable=False, default=0) # Non-cancelled bookings staying this night
+    revenue = Column(Float, nullable=False, default=0.0) # Their total_price spread over their nights
+    cancellations = Column(Integer, nullable=False, default=0) # Bookings cancelled on this day
+    refunds = Column(Float, nullable=False, default=0.0) # Refunds issued on this day
+
+    __table_args__ = (
+        # Platform-wide daily series (admin dashboards without a room filter)
+        Index("ix_room_daily_stats_day", "day"),
+    )
+
+class RoomFeature(Base):
+    """Inverted index over Room.amenities / Room.booking_options for filtered search"""
+    __tablename__ = "room_features"
+
+    room_id = Column(Integer, ForeignKey("rooms.id", ondelete="CASCADE"), primary_key=True)
+    kind = Column(String, primary_key=True)  # "amenity" or "booking_option"
+    value = Column(String, primary_key=True)
+
+    __table_args__ = (
+        # Serves "which rooms have feature X" lookups without touching rooms
+        Index("ix_room_features_kind_value_room", "kind", "value", "room_id"),
+    )
 
 # Enums for status
 class BookingStatusEnum(str, enum.Enum):
@@ -82,6 +153,7 @@ class Booking(Base):
     start_date = Column(DateTime, nullable=False)
     end_date = Column(DateTime, nullable=False)
     total_price = Column(Float, nullable=False)
+    nightly_rates = Column(JSON, nullable=True) # Quoted rate of each night before long-stay discounts
     status = Column(String, default="pending") # pending, confirmed, modified, cancelled, completed
     guests = Column(Integer, default=1)
     
@@ -104,6 +176,13 @@ class Booking(Base):
     modifications = relationship("BookingModification", back_populates="booking")
     review = relationship("Review", back_populates="booking", uselist=False)
 
+    __table_args__ = (
+        # Date-overlap checks for availability search and reservation
+        Index("ix_bookings_room_dates", "room_id", "start_date", "end_date"),
+        # A user's bookings by check-in date (GET /bookings/)
+        Index("ix_bookings_user_start", "user_id", "start_date"),
+    )
+
 class BookingModification(Base):
     """Track booking modifications history"""
     __tablename__ = "booking_modifications"
@@ -154,16 +233,23 @@ class Review(Base):
     room = relationship("Room", back_populates="reviews")
     booking = relationship("Booking", back_populates="review")
 
-class RoomAvailability(Base):
-    """Calendar-based availability and pricing"""
-    __tablename__ = "room_availability"
+    __table_args__ = (
+        # Approved reviews of a room, newest first / by rating
+        Index("ix_reviews_room_approved_created", "room_id", "is_approved", "created_at"),
+        Index("ix_reviews_room_approved_rating", "room_id", "is_approved", "rating"),
+    )
+
+class RoomAvailabilityRange(Base):
+    """Host calendar as run-length encoded day ranges (see host_calendar.py)"""
+    __tablename__ = "room_availability_ranges"
     
     id = Column(Integer, primary_key=True, index=True)
-    room_id = Column(Integer, ForeignKey("rooms.id"))
-    date = Column(Date, nullable=False)
+    room_id = Column(Integer, ForeignKey("rooms.id"), nullable=False)
+    start_date = Column(Date, nullable=False)
+    end_date = Column(Date, nullable=False)  # inclusive
     
-    is_available = Column(Boolean, default=True)
-    price_override = Column(Float, nullable=True)  # Override default room price for this date
+    is_available = Column(Boolean, nullable=False, default=True)
+    price_override = Column(Float, nullable=True)  # Override default room price for these dates
     
     # For host to add notes
     notes = Column(Text, nullable=True)
@@ -172,3 +258,8 @@ class RoomAvailability(Base):
     
     room = relationship("Room", back_populates="availability")
 
+    __table_args__ = (
+        # Ranges of a room overlapping a date window (a room's ranges never overlap)
+        Index("ix_room_availability_ranges_room_dates", "room_id", "start_date", "end_date"),
+    )
+
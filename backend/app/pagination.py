@@ -0,0 +1,66 @@
+"""
+Opaque cursors for keyset pagination.
+A cursor records the sort key values of the last row on a page so the next
+page can seek straight to it through an index instead of scanning OFFSET rows.
+"""
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import tuple_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+class InvalidCursor(ValueError):
+    pass
+
+def encode_cursor(data: dict) -> str:
+    raw = json.dumps(data, separators=(",", ":"), default=str).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> dict:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        data = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise InvalidCursor("Malformed cursor")
+    if not isinstance(data, dict):
+        raise InvalidCursor("Malformed cursor")
+    return data
+
+def page_cursor(sort: str, columns, row) -> str:
+    """Cursor pointing just past `row` in the given sort order"""
+    values = []
+    for column in columns:
+        value = getattr(row, column.key)
+        values.append(value.isoformat() if isinstance(value, (date, datetime)) else value)
+    return encode_cursor({"sort": sort, "after": values})
+
+def cursor_position(cursor: str, sort: str, columns) -> list:
+    """Decode a cursor issued by page_cursor into typed keyset values"""
+    data = decode_cursor(cursor)
+    values = data.get("after")
+    if data.get("sort") != sort or not isinstance(values, list) or len(values) != len(columns):
+        raise InvalidCursor("Cursor does not match sort order")
+    try:
+        return [
+            _coerce(column.type.python_type, value)
+            for column, value in zip(columns, values)
+        ]
+    except (TypeError, ValueError):
+        raise InvalidCursor("Malformed cursor")
+
+def _coerce(python_type, value):
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return python_type(value)
+
+def keyset_filter(columns, values, descending: bool = False):
+    """Rows strictly after `values` in (columns) order, as a row-value comparison"""
+    if descending:
+        return tuple_(*columns) < tuple_(*values)
+    return tuple_(*columns) > tuple_(*values)
+
+def keyset_order(columns, descending: bool = False):
+    return [column.desc() if descending else column.asc() for column in columns]
@@ -0,0 +1,153 @@
+"""
+Nightly price engine.
+Each night of a stay costs the price_override of the host calendar range
+covering that date when one is set, otherwise Room.price. Long-stay discounts then apply to
+the whole stay: Room.monthly_discount from 28 nights, Room.weekly_discount
+from 7 nights (both in percent).
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, NamedTuple, Optional
+from sqlalchemy import and_, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from . import models
+
+WEEKLY_MIN_NIGHTS = 7
+MONTHLY_MIN_NIGHTS = 28
+# Longest stay that can be quoted or booked (one rate per night is built)
+MAX_STAY_NIGHTS = 365
+
+class Stay(NamedTuple):
+    room_id: int
+    start_date: date
+    end_date: date
+
+class Quote(NamedTuple):
+    room_id: int
+    start_date: date
+    end_date: date
+    nightly_rates: List[float]
+    subtotal: float
+    discount: float
+    total: float
+
+    @property
+    def nights(self) -> int:
+        return len(self.nightly_rates)
+
+def stay_nights(start_date: date, end_date: date) -> List[date]:
+    return [start_date + timedelta(days=offset) for offset in range((end_date - start_date).days)]
+
+def long_stay_discount_pct(room: models.Room, nights: int) -> float:
+    if nights >= MONTHLY_MIN_NIGHTS and room.monthly_discount:
+        return room.monthly_discount
+    if nights >= WEEKLY_MIN_NIGHTS and room.weekly_discount:
+        return room.weekly_discount
+    return 0.0
+
+def price_nights(room: models.Room, nights: Iterable[date], overrides: Dict[date, float]) -> List[float]:
+    return [overrides.get(night, room.price) for night in nights]
+
+def price_stay(room: models.Room, start_date: date, end_date: date, overrides: Dict[date, float]) -> Quote:
+    """Price one stay from already-loaded overrides (no database access)"""
+    rates = price_nights(room, stay_nights(start_date, end_date), overrides)
+    subtotal = sum(rates)
+    discount = subtotal * long_stay_discount_pct(room, len(rates)) / 100
+    return Quote(
+        room_id=room.id,
+        start_date=start_date,
+        end_date=end_date,
+        nightly_rates=rates,
+        subtotal=round(subtotal, 2),
+        discount=round(discount, 2),
+        total=round(subtotal - discount, 2),
+    )
+
+def overrides_query(stays: Iterable[Stay]):
+    """One SELECT covering the price override ranges of every stay.
+    Stays sharing a window (the search case) collapse into a single IN clause."""
+    rooms_by_window = defaultdict(set)
+    for stay in stays:
+        rooms_by_window[(stay.start_date, stay.end_date)].add(stay.room_id)
+
+    ranges = models.RoomAvailabilityRange
+    windows = [
+        and_(
+            ranges.room_id.in_(room_ids),
+            ranges.start_date < end_date,
+            ranges.end_date >= start_date
+        )
+        for (start_date, end_date), room_ids in rooms_by_window.items()
+    ]
+    return select(
+        ranges.room_id,
+        ranges.start_date,
+        ranges.end_date,
+        ranges.price_override
+    ).where(
+        ranges.price_override.isnot(None),
+        or_(*windows)
+    )
+
+def group_overrides(rows) -> Dict[int, List[tuple]]:
+    """(start_date, end_date, price_override) ranges per room"""
+    overrides = defaultdict(list)
+    for room_id, start_date, end_date, price_override in rows:
+        overrides[room_id].append((start_date, end_date, price_override))
+    return overrides
+
+def stay_overrides(ranges: List[tuple], start_date: date, end_date: date) -> Dict[date, float]:
+    """Per-night overrides of one stay, expanded from its room's ranges"""
+    overrides = {}
+    for range_start, range_end, price_override in ranges:
+        night = max(range_start, start_date)
+        while night <= range_end and night < end_date:
+            overrides[night] = price_override
+            night += timedelta(days=1)
+    return overrides
+
+def _rooms_query(room_ids):
+    return select(models.Room).where(
+        models.Room.id.in_(room_ids),
+        models.Room.is_deleted == False
+    )
+
+def _assemble(stays: List[Stay], rooms: Dict[int, models.Room], override_rows) -> List[Optional[Quote]]:
+    overrides = group_overrides(override_rows)
+    return [
+        price_stay(
+            rooms[stay.room_id],
+            stay.start_date,
+            stay.end_date,
+            stay_overrides(overrides.get(stay.room_id, []), stay.start_date, stay.end_date)
+        )
+        if stay.room_id in rooms else None
+        for stay in stays
+    ]
+
+def quote_stays(db: Session, stays: List[Stay], rooms: Optional[Dict[int, models.Room]] = None) -> List[Optional[Quote]]:
+    """Quote many room x date-range stays with at most two queries.
+    Returns quotes in the order of `stays`; None where the room does not exist."""
+    if not stays:
+        return []
+    rooms = dict(rooms or {})
+    missing = {stay.room_id for stay in stays} - rooms.keys()
+    if missing:
+        for room in db.execute(_rooms_query(missing)).scalars():
+            rooms[room.id] = room
+    return _assemble(stays, rooms, db.execute(overrides_query(stays)))
+
+async def quote_stays_async(db: AsyncSession, stays: List[Stay], rooms: Optional[Dict[int, models.Room]] = None) -> List[Optional[Quote]]:
+    """quote_stays for AsyncSession callers"""
+    if not stays:
+        return []
+    rooms = dict(rooms or {})
+    missing = {stay.room_id for stay in stays} - rooms.keys()
+    if missing:
+        for room in (await db.execute(_rooms_query(missing))).scalars():
+            rooms[room.id] = room
+    return _assemble(stays, rooms, (await db.execute(overrides_query(stays))).all())
+
+def quote_stay(db: Session, room: models.Room, start_date: date, end_date: date) -> Quote:
+    return quote_stays(db, [Stay(room.id, start_date, end_date)], rooms={room.id: room})[0]
@@ -0,0 +1,75 @@
+"""
+Denormalized rating aggregates.
+RoomRatingStats keeps a 1-5 histogram of approved reviews per room and
+Room.average_rating / Room.review_count are derived from it, so listing pages
+never run AVG/COUNT over reviews. Counters are adjusted with in-place SQL
+increments (INSERT ... ON CONFLICT DO UPDATE where the database supports it)
+so concurrent reviews cannot lose updates or race to create the row.
+"""
+from sqlalchemy import case, delete, func, insert, select, true, update
+from sqlalchemy.orm import Session
+from . import models, database
+
+STARS = range(1, 6)
+
+def _stars_column(rating: int):
+    return getattr(models.RoomRatingStats, f"stars_{rating}")
+
+def _review_count():
+    return sum(_stars_column(stars) for stars in STARS)
+
+def _rating_sum():
+    return sum(stars * _stars_column(stars) for stars in STARS)
+
+def _refresh_room(db: Session, room_filter):
+    """Recompute Room.average_rating / review_count from the histogram rows"""
+    stats = models.RoomRatingStats
+    correlated = stats.room_id == models.Room.id
+    count = select(_review_count()).where(correlated).scalar_subquery()
+    average = select(
+        case((_review_count() > 0, _rating_sum() * 1.0 / _review_count()), else_=0.0)
+    ).where(correlated).scalar_subquery()
+    db.execute(
+        update(models.Room)
+        .where(room_filter)
+        .values(review_count=func.coalesce(count, 0), average_rating=func.coalesce(average, 0.0))
+        .execution_options(synchronize_session=False)
+    )
+
+def record_review(db: Session, room_id: int, rating: int, delta: int):
+    """Count (+1) or uncount (-1) one approved review. Does not commit."""
+    column = _stars_column(rating)
+    first_row = {f"stars_{stars}": (max(delta, 0) if stars == rating else 0) for stars in STARS}
+    statement = database.upsert_insert(db, models.RoomRatingStats)
+    if statement is not None:
+        db.execute(
+            statement.values(room_id=room_id, **first_row)
+            .on_conflict_do_update(index_elements=["room_id"], set_={column.key: column + delta})
+        )
+    else:
+        result = db.execute(
+            update(models.RoomRatingStats)
+            .where(models.RoomRatingStats.room_id == room_id)
+            .values({column: column + delta})
+        )
+        if result.rowcount == 0:
+            db.execute(insert(models.RoomRatingStats).values(room_id=room_id, **first_row))
+    _refresh_room(db, models.Room.id == room_id)
+
+def recompute_all(db: Session):
+    """Rebuild every histogram and room aggregate from the reviews table"""
+    db.execute(delete(models.RoomRatingStats))
+    counts = [
+        func.sum(case((models.Review.rating == stars, 1), else_=0))
+        for stars in STARS
+    ]
+    db.execute(
+        insert(models.RoomRatingStats).from_select(
+            ["room_id"] + [f"stars_{stars}" for stars in STARS],
+            select(models.Review.room_id, *counts)
+            .where(models.Review.is_approved == True, models.Review.room_id.isnot(None))
+            .group_by(models.Review.room_id)
+        )
+    )
+    _refresh_room(db, true())
+    db.commit()
@@ -0,0 +1,156 @@
+"""
+Response cache for the public read endpoints (room listing, room detail, room
+reviews, availability heatmap), as ASGI middleware so a hit costs neither a
+database connection nor Pydantic serialization.
+
+Entries are keyed by path + normalized query string + the current version of
+each tag the response depends on. Writes call invalidate(tag, ...) after
+committing, which gives those tags fresh versions: every entry built from the
+old data stops matching at once, whatever its parameters. Tags:
+    rooms        any room listing (room create/update/delete, reviews)
+    calendar     listings filtered by dates and the availability heatmap
+                 (availability, bookings)
+    room:<id>    GET /rooms/<id>
+    reviews:<id> GET /api/reviews/room/<id>
+
+Every response carries a strong ETag and Cache-Control; a matching
+If-None-Match gets 304. With CACHE_REDIS_URL set, entries and tag versions are
+shared by all workers and entries live RESPONSE_CACHE_TTL (default 300)
+seconds. Without it each worker invalidates only its own copy, so the TTL
+defaults to 5 seconds: that bounds how long another worker can serve a listing
+older than a write.
+"""
+import hashlib
+import os
+import re
+import uuid
+from urllib.parse import parse_qsl, urlencode
+from . import cache
+
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2048))
+# Per-worker caches cannot see other workers' invalidations; keep them short-lived
+RESPONSE_CACHE_TTL = int(os.getenv("RESPONSE_CACHE_TTL", 300 if cache.REDIS_URL else 5))
+# Browsers and CDNs revalidate with If-None-Match after this many seconds
+RESPONSE_MAX_AGE = int(os.getenv("RESPONSE_MAX_AGE", 0))
+
+CACHE_CONTROL = f"public, max-age={RESPONSE_MAX_AGE}, must-revalidate"
+# Response headers worth replaying from a cached entry
+STORED_HEADERS = {"content-type", "x-next-cursor"}
+
+responses = cache.get_cache("responses", RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+tag_versions = cache.get_cache("response_tags", RESPONSE_CACHE_SIZE * 4, 7 * 24 * 3600)
+
+def _listing_tags(match, params):
+    if "start_date" in params or "end_date" in params:
+        return ["rooms", "calendar"]
+    return ["rooms"]
+
+# path pattern -> tags of the responses it produces
+CACHED_ROUTES = [
+    (re.compile(r"^/rooms/$"), _listing_tags),
+    (re.compile(r"^/rooms/(\d+)$"), lambda match, params: [f"room:{match[1]}"]),
+    (re.compile(r"^/api/reviews/room/(\d+)$"), lambda match, params: [f"reviews:{match[1]}"]),
+    (re.compile(r"^/api/availability/heatmap$"), lambda match, params: ["rooms", "calendar"]),
+]
+
+def room_tags(room_id: int):
+    return ["rooms", f"room:{room_id}"]
+
+def review_tags(room_id: int):
+    return ["rooms", f"room:{room_id}", f"reviews:{room_id}"]
+
+def invalidate(*tags: str):
+    for tag in tags:
+        tag_versions.set(tag, uuid.uuid4().hex[:12])
+
+def _version(tag: str) -> str:
+    version = tag_versions.get(tag)
+    if version is None:
+        # Unknown or evicted: start a new version so no older entry can match
+        version = uuid.uuid4().hex[:12]
+        tag_versions.set(tag, version)
+    return version
+
+def _key(path: str, params, tags) -> str:
+    versions = ",".join(f"{tag}={_version(tag)}" for tag in tags)
+    raw = f"{path}?{urlencode(params)}|{versions}"
+    return hashlib.sha1(raw.encode()).hexdigest()
+
+def _etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest() + '"'
+
+def _not_modified(request_headers, etag: str) -> bool:
+    if_none_match = request_headers.get(b"if-none-match")
+    if not if_none_match:
+        return False
+    candidates = [value.strip() for value in if_none_match.decode("latin-1").split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+class ResponseCacheMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        for pattern, tags_for in CACHED_ROUTES:
+            match = pattern.match(path)
+            if match:
+                break
+        else:
+            await self.app(scope, receive, send)
+            return
+
+        params = sorted(
+            (name, value)
+            for name, value in parse_qsl(scope["query_string"].decode("latin-1"), keep_blank_values=False)
+        )
+        key = _key(path, params, tags_for(match, dict(params)))
+        request_headers = dict(scope["headers"])
+
+        entry = responses.get(key)
+        if entry is not None:
+            await self._send(send, request_headers, entry["headers"], entry["body"].encode(), entry["etag"])
+            return
+
+        # Miss: run the endpoint and buffer its response
+        started = {}
+        chunks = []
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                started.update(message)
+            elif message["type"] == "http.response.body":
+                chunks.append(message.get("body", b""))
+
+        await self.app(scope, receive, capture)
+
+        body = b"".join(chunks)
+        headers = [
+            (name.decode("latin-1"), value.decode("latin-1"))
+            for name, value in started.get("headers", [])
+            if name.lower() != b"content-length"
+        ]
+        if started.get("status") != 200:
+            await send({"type": "http.response.start", "status": started["status"], "headers": started["headers"]})
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        stored = [(name, value) for name, value in headers if name.lower() in STORED_HEADERS]
+        etag = _etag(body)
+        responses.set(key, {"headers": stored, "body": body.decode(), "etag": etag})
+        await self._send(send, request_headers, headers, body, etag)
+
+    async def _send(self, send, request_headers, headers, body: bytes, etag: str):
+        headers = [(name.encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+        headers += [(b"etag", etag.encode()), (b"cache-control", CACHE_CONTROL.encode())]
+        if _not_modified(request_headers, etag):
+            await send({"type": "http.response.start", "status": 304, "headers": headers})
+            await send({"type": "http.response.body", "body": b""})
+            return
+        headers.append((b"content-length", str(len(body)).encode()))
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,73 @@
+"""
+Router for Booking Analytics
+Occupancy, ADR, revenue, cancellations and refunds per room, host and day,
+read from the daily rollups (see analytics.py). Admins can report on any host
+or room; other users on the rooms they host.
+"""
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import date
+from typing import List, NamedTuple, Optional
+from .. import models, schemas_extended, analytics
+from ..database import get_async_db
+from .. import auth
+
+router = APIRouter(prefix="/api/analytics", tags=["analytics"])
+
+class ReportScope(NamedTuple):
+    """Validated query parameters shared by every report"""
+    start_date: date
+    end_date: date
+    host_id: Optional[int]
+    room_id: Optional[int]
+
+async def report_scope(
+    start_date: date,
+    end_date: date,
+    host_id: Optional[int] = None,
+    room_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_async_db),
+    current_user: auth.Principal = Depends(auth.get_current_active_user)
+) -> ReportScope:
+    if end_date < start_date or (end_date - start_date).days + 1 > analytics.MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"end_date must be on or after start_date, at most {analytics.MAX_DAYS} days in total")
+    if current_user.role != "admin":
+        if host_id is not None and host_id != current_user.id:
+            raise HTTPException(status_code=403, detail="Not authorized")
+        host_id = current_user.id
+    if room_id is not None:
+        host = (await db.execute(
+            select(models.Room.host_id).where(models.Room.id == room_id, models.Room.is_deleted == False)
+        )).first()
+        if host is None or (host_id is not None and host.host_id != host_id):
+            raise HTTPException(status_code=404, detail="Room not found or you're not the host")
+    return ReportScope(start_date, end_date, host_id, room_id)
+
+@router.get("/summary", response_model=schemas_extended.AnalyticsSummary)
+async def get_summary(
+    scope: ReportScope = Depends(report_scope),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Totals over start_date..end_date (inclusive, at most 366 days).
+    - host_id / room_id narrow the report; without them admins get the whole platform
+      and other users all the rooms they host
+    """
+    return await analytics.summary(db, scope.start_date, scope.end_date, scope.host_id, scope.room_id)
+
+@router.get("/daily", response_model=List[schemas_extended.AnalyticsDay])
+async def get_daily(
+    scope: ReportScope = Depends(report_scope),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """One entry per day of the window, days without bookings included"""
+    return await analytics.daily(db, scope.start_date, scope.end_date, scope.host_id, scope.room_id)
+
+@router.get("/rooms", response_model=List[schemas_extended.AnalyticsRoom])
+async def get_rooms(
+    scope: ReportScope = Depends(report_scope),
+    db: AsyncSession = Depends(get_async_db)
+):
+    """Totals of each room in scope over the window, by room id"""
+    return await analytics.per_room(db, scope.start_date, scope.end_date, scope.host_id, scope.room_id)
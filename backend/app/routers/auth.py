@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
 from datetime import timedelta
 from .. import schemas, models, database, crud, auth
@@ -15,8 +16,8 @@ def forgot_password(email: schemas.UserBase):
     return {"message": f"Password reset instructions sent to {email.email}"}
 
 @router.post("/register", response_model=schemas.UserResponse)
-def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def register(user: schemas.UserCreate, db: AsyncSession = Depends(database.get_async_db)):
+    db_user = await crud.get_user_by_email_async(db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
@@ -24,17 +25,35 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     # Even if the request body contains role='admin', this overrides it.
     user.role = "user"
     
-    return crud.create_user(db=db, user=user)
+    # Return the connection to the pool while bcrypt runs
+    await db.rollback()
+    hashed_password = await auth.hash_password(user.password)
+    try:
+        return await crud.create_user_async(db=db, user=user, hashed_password=hashed_password)
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Email already registered")
 
 @router.post("/login", response_model=schemas.Token)
-def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depends(database.get_db)):
-    user = crud.get_user_by_email(db, email=form_data.username)
-    if not user or not auth.verify_password(form_data.password, user.hashed_password):
+async def login(form_data: OAuth2PasswordRequestForm = Depends(), db: AsyncSession = Depends(database.get_async_db)):
+    user = await crud.get_user_by_email_async(db, email=form_data.username)
+    verified, new_hash = (False, None)
+    if user:
+        # Keep the loaded user but return the connection to the pool while bcrypt runs
+        db.expunge(user)
+        await db.rollback()
+        verified, new_hash = await auth.verify_and_update_password(form_data.password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect username or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
+    if new_hash:
+        # Hash parameters changed (BCRYPT_ROUNDS): upgrade the stored hash
+        db.add(user)
+        user.hashed_password = new_hash
+        await db.commit()
     access_token_expires = timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
         data={"sub": user.email, "role": user.role}, expires_delta=access_token_expires
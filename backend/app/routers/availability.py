@@ -1,13 +1,16 @@
 """
 Router for Room Availability & Calendar Management
-Host calendar for setting blocked dates and per-date pricing
+Host calendar for setting blocked dates and per-date pricing, stored as
+date ranges (see host_calendar.py)
 """
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from datetime import date, timedelta
+from datetime import date
 from typing import List
-from .. import models, schemas_extended
-from ..database import get_db
+from .. import models, schemas_extended, response_cache, host_calendar, inventory, heatmap
+from ..database import get_db, get_async_db
 from .. import auth
 
 router = APIRouter(prefix="/api/availability", tags=["calendar"])
@@ -16,7 +19,7 @@ router = APIRouter(prefix="/api/availability", tags=["calendar"])
 def set_room_availability(
     availability: schemas_extended.RoomAvailabilityCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Set availability for a specific date (host only)"""
     # Verify user is host of this room
@@ -28,44 +31,72 @@ def set_room_availability(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found or you're not the host")
     
-    # Check if availability already exists for this date
-    existing = db.query(models.RoomAvailability).filter(
-        models.RoomAvailability.room_id == availability.room_id,
-        models.RoomAvailability.date == availability.date
-    ).first()
-    
-    if existing:
-        # Update existing
-        existing.is_available = availability.is_available
-        existing.price_override = availability.price_override
-        existing.notes = availability.notes
+    change = host_calendar.CalendarChange(
+        availability.date,
+        availability.date,
+        {"is_available": availability.is_available, "price_override": availability.price_override, "notes": availability.notes}
+    )
+    with inventory.rooms_lock(db, [availability.room_id]):
+        host_calendar.apply(db, [availability.room_id], [change])
         db.commit()
-        db.refresh(existing)
-        return existing
-    
-    # Create new
-    db_availability = models.RoomAvailability(**availability.dict())
-    db.add(db_availability)
-    db.commit()
-    db.refresh(db_availability)
+    response_cache.invalidate("calendar")
     
-    return db_availability
+    return host_calendar.get_day(db, availability.room_id, availability.date)
 
 @router.get("/room/{room_id}", response_model=List[schemas_extended.RoomAvailabilityResponse])
-def get_room_availability(
+async def get_room_availability(
     room_id: int,
     start_date: date,
     end_date: date,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get availability for a room within a date range"""
-    availability = db.query(models.RoomAvailability).filter(
-        models.RoomAvailability.room_id == room_id,
-        models.RoomAvailability.date >= start_date,
-        models.RoomAvailability.date <= end_date
-    ).all()
-    
-    return availability
+    """Get availability for a room within a date range, one entry per day the host has set"""
+    rows = (await db.execute(host_calendar.ranges_query([room_id], start_date, end_date))).all()
+    return list(host_calendar.expand(rows, start_date, end_date))
+
+@router.get("/room/{room_id}/ranges", response_model=schemas_extended.CalendarRangesResponse)
+async def get_room_availability_ranges(
+    room_id: int,
+    start_date: date,
+    end_date: date,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Range-encoded calendar for calendar UIs: runs of days sharing the same
+    availability, price and notes. Days outside every range are available at
+    the room's base price.
+    """
+    rows = (await db.execute(host_calendar.ranges_query([room_id], start_date, end_date))).all()
+    return {
+        "room_id": room_id,
+        "start_date": start_date,
+        "end_date": end_date,
+        "ranges": list(host_calendar.clip(rows, start_date, end_date)),
+    }
+
+@router.get("/heatmap", response_model=schemas_extended.AvailabilityHeatmap)
+async def get_availability_heatmap(
+    room_ids: str,
+    start_date: date,
+    end_date: date,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Availability and nightly prices of many rooms across a date window
+    (inclusive), with bookings, blocked dates and price overrides merged.
+    - room_ids: comma-separated, at most 200; unknown or deleted rooms are left out
+    - at most 366 days
+    """
+    try:
+        ids = [int(room_id) for room_id in room_ids.split(",") if room_id.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="room_ids must be comma-separated integers")
+    if not 1 <= len(ids) <= heatmap.MAX_ROOMS:
+        raise HTTPException(status_code=400, detail=f"Provide between 1 and {heatmap.MAX_ROOMS} room_ids")
+    if end_date < start_date or (end_date - start_date).days + 1 > heatmap.MAX_DAYS:
+        raise HTTPException(status_code=400, detail=f"end_date must be on or after start_date, at most {heatmap.MAX_DAYS} days in total")
+    
+    return await heatmap.heatmap(db, ids, start_date, end_date)
 
 @router.put("/room/{room_id}/date/{target_date}", response_model=schemas_extended.RoomAvailabilityResponse)
 def update_date_availability(
@@ -73,7 +104,7 @@ def update_date_availability(
     target_date: date,
     update: schemas_extended.RoomAvailabilityUpdate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Update availability for a specific date (host only)"""
     # Verify host
@@ -85,26 +116,18 @@ def update_date_availability(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found or you're not the host")
     
-    availability = db.query(models.RoomAvailability).filter(
-        models.RoomAvailability.room_id == room_id,
-        models.RoomAvailability.date == target_date
-  ).first()
-    
-    if not availability:
+    if not host_calendar.get_day(db, room_id, target_date):
         raise HTTPException(status_code=404, detail="Availability record not found")
     
     # Update fields
-    if update.is_available is not None:
-        availability.is_available = update.is_available
-    if update.price_override is not None:
-        availability.price_override = update.price_override
-    if update.notes is not None:
-        availability.notes = update.notes
-    
-    db.commit()
-    db.refresh(availability)
-    
-    return availability
+    fields = {field: value for field, value in update.model_dump().items() if value is not None}
+    if fields:
+        with inventory.rooms_lock(db, [room_id]):
+            host_calendar.apply(db, [room_id], [host_calendar.CalendarChange(target_date, target_date, fields)])
+            db.commit()
+        response_cache.invalidate("calendar")
+    
+    return host_calendar.get_day(db, room_id, target_date)
 
 @router.post("/room/{room_id}/block-dates")
 def block_dates_bulk(
@@ -113,7 +136,7 @@ def block_dates_bulk(
     end_date: date,
     notes: str = None,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Block multiple dates at once (host only)"""
     # Verify host
@@ -125,32 +148,58 @@ def block_dates_bulk(
     if not room:
         raise HTTPException(status_code=404, detail="Room not found or you're not the host")
     
-    # Create availability records for each date
-    current_date = start_date
-    created_count = 0
+    if end_date < start_date:
+        raise HTTPException(status_code=400, detail="end_date must not be before start_date")
     
-    while current_date <= end_date:
-        # Check if exists
-        existing = db.query(models.RoomAvailability).filter(
-            models.RoomAvailability.room_id == room_id,
-            models.RoomAvailability.date == current_date
-        ).first()
-        
-        if existing:
-            existing.is_available = False
-            existing.notes = notes
-        else:
-            new_availability = models.RoomAvailability(
-                room_id=room_id,
-                date=current_date,
-                is_available=False,
-                notes=notes
-            )
-            db.add(new_availability)
-            created_count += 1
-        
-        current_date += timedelta(days=1)
+    change = host_calendar.CalendarChange(start_date, end_date, {"is_available": False, "notes": notes})
+    with inventory.rooms_lock(db, [room_id]):
+        existing = host_calendar.existing_days(db, room_id, start_date, end_date)
+        try:
+            blocked = host_calendar.apply(db, [room_id], [change])
+        except host_calendar.InvalidChange as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        db.commit()
+    response_cache.invalidate("calendar")
     
-    db.commit()
+    return {"message": f"Blocked {blocked} dates", "created": blocked - existing}
+
+@router.post("/bulk", response_model=schemas_extended.CalendarBulkResult)
+def update_calendar_bulk(
+    update: schemas_extended.CalendarBulkUpdate,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_user)
+):
+    """
+    Block/unblock and reprice date ranges across many rooms in one call (host only).
+    Changes apply in order, so a later change wins where ranges overlap.
+    """
+    room_ids = set(update.room_ids)
+    hosted = set(db.execute(
+        select(models.Room.id).where(
+            models.Room.id.in_(room_ids),
+            models.Room.host_id == current_user.id
+        )
+    ).scalars())
+    if hosted != room_ids:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Rooms not found or you're not the host: {sorted(room_ids - hosted)}"
+        )
+    
+    changes = [
+        host_calendar.CalendarChange(
+            change.start_date,
+            change.end_date,
+            {field: getattr(change, field) for field in host_calendar.FIELDS if field in change.model_fields_set}
+        )
+        for change in update.changes
+    ]
+    with inventory.rooms_lock(db, room_ids):
+        try:
+            written = host_calendar.apply(db, room_ids, changes)
+        except host_calendar.InvalidChange as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        db.commit()
+    response_cache.invalidate("calendar")
     
-    return {"message": f"Blocked {(end_date - start_date).days + 1} dates", "created": created_count}
+    return {"rooms": len(room_ids), "days_written": written}
@@ -2,53 +2,26 @@
 Router for Booking Modifications & Cancellations
 Handles date changes, guest count updates, and cancellations with refund calculation
 """
+import json
 from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta
 from typing import List
-from .. import models, schemas_extended
+from .. import models, schemas_extended, response_cache, booking_changes, inventory, cancellation, analytics
 from ..database import get_db
 from .. import auth
 
 router = APIRouter(prefix="/bookings/modifications", tags=["booking-modifications"])
 
-def calculate_refund(booking: models.Booking, cancellation_date: datetime) -> float:
-    """Calculate refund based on cancellation policy"""
-    days_until_checkin = (booking.start_date - cancellation_date).days
-    
-    if booking.cancellation_policy == "flexible":
-        # Full refund if cancelled 24+ hours before check-in
-        if days_until_checkin >= 1:
-            return booking.total_price
-        else:
-            return booking.total_price * 0.5  # 50% refund
-    
-    elif booking.cancellation_policy == "moderate":
-        # Full refund if cancelled 5+ days before
-        if days_until_checkin >= 5:
-            return booking.total_price
-        elif days_until_checkin >= 1:
-            return booking.total_price * 0.5
-        else:
-            return 0.0
-    
-    elif booking.cancellation_policy == "strict":
-        # Full refund if cancelled 14+ days before
-        if days_until_checkin >= 14:
-            return booking.total_price
-        elif days_until_checkin >= 7:
-            return booking.total_price * 0.5
-        else:
-            return 0.0
-    
-    return 0.0
+REPORT_CHUNK_LINES = 200
 
 @router.put("/{booking_id}/modify", response_model=schemas_extended.BookingModificationResponse)
 def modify_booking(
     booking_id: int,
     modification: schemas_extended.BookingModificationCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Modify an existing booking (dates or guests)"""
     booking = db.query(models.Booking).filter(
@@ -62,82 +35,61 @@ def modify_booking(
     if booking.status == "cancelled":
         raise HTTPException(status_code=400, detail="Cannot modify cancelled booking")
     
-    # Store old values
-    old_start = booking.start_date
-    old_end = booking.end_date
-    old_guests = booking.guests
-    old_price = booking.total_price
-    
-    # Calculate new price
-    new_start = modification.new_start_date or booking.start_date
-    new_end = modification.new_end_date or booking.end_date
-    new_guests = modification.new_guests or booking.guests
-    
-    # Get room to calculate new price
-    room = db.query(models.Room).filter(models.Room.id == booking.room_id).first()
-    nights = (new_end - new_start).days
-    new_price = room.price * nights
-    price_diff = new_price - old_price
-    
-    # Create modification record
-    mod_record = models.BookingModification(
-        booking_id=booking_id,
-        old_start_date=old_start,
-        old_end_date=old_end,
-        new_start_date=new_start,
-        new_end_date=new_end,
-        old_guests=old_guests,
-        new_guests=new_guests,
-        old_price=old_price,
-        new_price=new_price,
-        price_difference=price_diff,
-        modification_reason=modification.modification_reason,
-        modified_by_user_id=current_user.id
-    )
-    
-    # Update booking
-    booking.start_date = new_start
-    booking.end_date = new_end
-    booking.guests = new_guests
-    booking.total_price = new_price
-    booking.status = "modified"
-    booking.updated_at = datetime.utcnow()
-    
-    db.add(mod_record)
-    db.commit()
-    db.refresh(mod_record)
+    # Reprices only the changed nights and re-checks availability for them
+    try:
+        mod_record = booking_changes.modify(
+            db,
+            booking,
+            new_start=modification.new_start_date,
+            new_end=modification.new_end_date,
+            new_guests=modification.new_guests,
+            reason=modification.modification_reason,
+            user_id=current_user.id
+        )
+    except booking_changes.InvalidModification as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except inventory.BookingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    response_cache.invalidate("calendar")
     
     return mod_record
 
 @router.post("/{booking_id}/cancel", response_model=schemas_extended.CancellationResponse)
 def cancel_booking(
     booking_id: int,
-    cancellation: schemas_extended.BookingCancellation,
+    cancellation_request: schemas_extended.BookingCancellation,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Cancel a booking with policy-based refund"""
     booking = db.query(models.Booking).filter(
         models.Booking.id == booking_id,
         models.Booking.user_id == current_user.id
-    ).first()
+    ).with_for_update().first()  # a concurrent cancel must not be counted twice
     
     if not booking:
         raise HTTPException(status_code=404, detail="Booking not found")
     
     if booking.status == "cancelled":
+        db.rollback()
         raise HTTPException(status_code=400, detail="Booking already cancelled")
     
     # Calculate refund
-    refund = calculate_refund(booking, datetime.utcnow())
+    now = datetime.utcnow()
+    refund = cancellation.refund_amount(booking, now)
     
     # Update booking
     booking.status = "cancelled"
-    booking.cancelled_at = datetime.utcnow()
-    booking.cancellation_reason = cancellation.cancellation_reason
+    booking.cancelled_at = now
+    booking.cancellation_reason = cancellation_request.cancellation_reason
     booking.refund_amount = refund
     
+    rollup = analytics.Rollup()
+    rollup.stay(booking, -1, since=now.date())  # nights already stayed remain sold
+    rollup.cancellation(booking.room_id, now, refund)
+    rollup.flush(db)
     db.commit()
+    response_cache.invalidate("calendar")
     
     return schemas_extended.CancellationResponse(
         booking_id=booking_id,
@@ -151,7 +103,7 @@ def cancel_booking(
 def get_booking_history(
     booking_id: int,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Get modification history for a booking"""
     booking = db.query(models.Booking).filter(
@@ -167,3 +119,60 @@ def get_booking_history(
     ).all()
     
     return modifications
+
+@router.post("/bulk-cancel")
+def bulk_cancel_bookings(
+    bulk: schemas_extended.BulkCancellation,
+    db: Session = Depends(get_db),
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
+):
+    """
+    Cancel every open booking on some rooms and/or dates (admin only), e.g. when
+    a property goes offline. Refunds follow each booking's cancellation policy
+    unless full_refund is set. All bookings are cancelled in one transaction.
+
+    Streams one JSON object per booking (application/x-ndjson), then a final
+    {"summary": ...} line.
+    """
+    if not bulk.room_ids and not (bulk.start_date and bulk.end_date):
+        raise HTTPException(status_code=400, detail="Provide room_ids and/or start_date and end_date")
+    if (bulk.start_date is None) != (bulk.end_date is None):
+        raise HTTPException(status_code=400, detail="Provide both start_date and end_date")
+    lower = upper = None
+    if bulk.start_date:
+        if bulk.end_date <= bulk.start_date:
+            raise HTTPException(status_code=400, detail="end_date must be after start_date")
+        lower, upper = inventory.night_bounds(bulk.start_date, bulk.end_date)
+    
+    now = datetime.utcnow()
+    results = cancellation.cancel_many(
+        db,
+        cancellation.cancellable(bulk.room_ids, lower, upper, now),
+        bulk.cancellation_reason,
+        now,
+        full_refund=bulk.full_refund,
+        dry_run=bulk.dry_run
+    )
+    if results and not bulk.dry_run:
+        response_cache.invalidate("calendar")
+    
+    def report():
+        outcome = "would_cancel" if bulk.dry_run else "cancelled"
+        # Lines go out in chunks: each chunk is one hop through the threadpool
+        for offset in range(0, len(results), REPORT_CHUNK_LINES):
+            lines = []
+            for result in results[offset:offset + REPORT_CHUNK_LINES]:
+                line = result._asdict()
+                line["start_date"] = result.start_date.isoformat()
+                line["end_date"] = result.end_date.isoformat()
+                line["status"] = outcome
+                lines.append(json.dumps(line) + "\n")
+            yield "".join(lines)
+        summary = {
+            "bookings": len(results),
+            "refund_total": round(sum(result.refund_amount for result in results), 2),
+            "dry_run": bulk.dry_run,
+        }
+        yield json.dumps({"summary": summary}) + "\n"
+    
+    return StreamingResponse(report(), media_type="application/x-ndjson")
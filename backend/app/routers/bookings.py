@@ -1,7 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-from typing import List
-from .. import schemas, database, crud, auth, models
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.orm import Session, noload, selectinload
+from datetime import date
+from typing import List, Optional
+from .. import schemas, schemas_extended, database, crud, auth, models, inventory, pricing, pagination
 
 router = APIRouter(
     prefix="/bookings",
@@ -12,7 +14,7 @@ router = APIRouter(
 def create_booking(
     booking: schemas.BookingCreate,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     try:
         # Log the user making the booking for debugging
@@ -30,8 +32,11 @@ def create_booking(
         days = delta.days
         if days <= 0:
              raise HTTPException(status_code=400, detail="Invalid booking dates")
+        if (booking.end_date.date() - booking.start_date.date()).days > pricing.MAX_STAY_NIGHTS:
+             raise HTTPException(status_code=400, detail=f"Stays are limited to {pricing.MAX_STAY_NIGHTS} nights")
         
-        total_price = days * room.price
+        quote = pricing.quote_stay(db, room, booking.start_date.date(), booking.end_date.date())
+        total_price = quote.total
 
         # Mock Payment Processing
         # In production, integrate with actual payment gateway
@@ -57,12 +62,15 @@ def create_booking(
             user_id=current_user.id, 
             total_price=total_price,
             payment_status=payment_status,
-            booking_status=booking_status
+            booking_status=booking_status,
+            nightly_rates=quote.nightly_rates
         )
         
         print(f"Booking created successfully: ID {result.id}")
         return result
         
+    except inventory.BookingConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except HTTPException:
         # Re-raise HTTP exceptions
         raise
@@ -76,6 +84,82 @@ def create_booking(
             detail=f"Internal server error: {str(e)}"
         )
 
-@router.get("/", response_model=List[schemas.BookingResponse])
-def read_bookings(current_user: models.User = Depends(auth.get_current_user), db: Session = Depends(database.get_db)):
-     return crud.get_user_bookings(db, user_id=current_user.id)
+# sort key -> (keyset columns, descending)
+BOOKING_SORTS = {
+    "newest": ((models.Booking.start_date, models.Booking.id), True),
+    "oldest": ((models.Booking.start_date, models.Booking.id), False),
+}
+# include= value -> relationship loaded with one extra SELECT ... IN query
+BOOKING_INCLUDES = {
+    "room": models.Booking.room,
+    "review": models.Booking.review,
+}
+BOOKING_STATUSES = {status.value for status in models.BookingStatusEnum}
+
+@router.get("/", response_model=List[schemas_extended.BookingWithDetails])
+def read_bookings(
+    response: Response,
+    status: Optional[str] = Query(None),  # Comma-separated list
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    include: Optional[str] = Query(None),  # Comma-separated: room, review
+    sort: str = Query("newest", pattern="^(newest|oldest)$"),
+    cursor: Optional[str] = Query(None),
+    skip: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    current_user: auth.Principal = Depends(auth.get_current_user),
+    db: Session = Depends(database.get_db)
+):
+    """
+    The current user's bookings, by check-in date (newest first by default):
+    - status: e.g. "confirmed,modified"
+    - start_date / end_date: only stays with a night on or after start_date /
+      before end_date
+    - include: "room,review" embeds the room and the review, loaded with one
+      query each whatever the page size
+    Pass the X-Next-Cursor response header back as `cursor` for the next page.
+    """
+    query = select(models.Booking).where(models.Booking.user_id == current_user.id)
+    
+    if status:
+        statuses = {value.strip() for value in status.split(",") if value.strip()}
+        unknown = statuses - BOOKING_STATUSES
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown status: {', '.join(sorted(unknown))}")
+        query = query.where(models.Booking.status.in_(statuses))
+    
+    if start_date and end_date and end_date <= start_date:
+        raise HTTPException(status_code=400, detail="end_date must be after start_date")
+    if start_date:
+        lower, _ = inventory.night_bounds(start_date, start_date)
+        query = query.where(models.Booking.end_date >= lower)
+    if end_date:
+        _, upper = inventory.night_bounds(end_date, end_date)
+        query = query.where(models.Booking.start_date < upper)
+    
+    included = {value.strip() for value in (include or "").split(",") if value.strip()}
+    if included - BOOKING_INCLUDES.keys():
+        raise HTTPException(status_code=400, detail=f"include accepts: {', '.join(BOOKING_INCLUDES)}")
+    # Relationships not asked for are left empty instead of lazy-loading per booking
+    query = query.options(*[
+        selectinload(relationship) if name in included else noload(relationship)
+        for name, relationship in BOOKING_INCLUDES.items()
+    ])
+    
+    columns, descending = BOOKING_SORTS[sort]
+    query = query.order_by(*pagination.keyset_order(columns, descending))
+    if cursor:
+        try:
+            position = pagination.cursor_position(cursor, sort, columns)
+        except pagination.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(pagination.keyset_filter(columns, position, descending))
+    else:
+        query = query.offset(skip)
+    
+    bookings = db.execute(query.limit(limit + 1)).scalars().all()
+    if len(bookings) > limit:
+        bookings = bookings[:limit]
+        response.headers[pagination.NEXT_CURSOR_HEADER] = pagination.page_cursor(sort, columns, bookings[-1])
+    
+    return bookings
@@ -0,0 +1,91 @@
+"""
+Router for room images
+GET /images/<file name> serves static/images/<file name>, or an AVIF / WebP
+sibling with the same stem when the client's Accept header allows it and the
+file exists (uploads get WebP variants, generate_image_variants.py adds AVIF
+and backfills older uploads). Responses carry a strong ETag, answer
+If-None-Match with 304 and support Range requests.
+
+With IMAGE_ACCEL_REDIRECT_PREFIX set (e.g. "/protected-images/", an nginx
+`internal` location aliased to static/images/), the body is handed to nginx
+with X-Accel-Redirect and sent with sendfile instead of through the worker.
+"""
+import os
+import re
+from fastapi import APIRouter, HTTPException, Request, Response
+from fastapi.responses import FileResponse
+from .. import images
+
+router = APIRouter(prefix="/images", tags=["images"])
+
+ACCEL_REDIRECT_PREFIX = os.getenv("IMAGE_ACCEL_REDIRECT_PREFIX")
+LEGACY_CACHE_CONTROL = "public, max-age=86400"
+
+SAFE_NAME = re.compile(r"^[A-Za-z0-9_-]+\.(jpg|jpeg|png|webp|avif)$")
+MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "webp": "image/webp",
+    "avif": "image/avif",
+}
+# Most compact first
+NEGOTIATED_FORMATS = ("avif", "webp")
+
+def _accepts(accept: str, media_type: str) -> bool:
+    for part in accept.split(","):
+        value, *params = part.strip().split(";")
+        if value.strip() == media_type:
+            return not any(param.strip().replace(" ", "") in ("q=0", "q=0.0") for param in params)
+    return False
+
+def _negotiate(file_name: str, accept: str):
+    """(file name, stat) of the best existing file for this request"""
+    stem, extension = file_name.rsplit(".", 1)
+    candidates = []
+    if extension in ("jpg", "jpeg", "png"):
+        candidates = [f"{stem}.{ext}" for ext in NEGOTIATED_FORMATS if _accepts(accept, MEDIA_TYPES[ext])]
+    for name in candidates + [file_name]:
+        try:
+            return name, os.stat(os.path.join(images.IMAGEDIR, name))
+        except FileNotFoundError:
+            continue
+    raise HTTPException(status_code=404, detail="Image not found")
+
+def _etag(name: str, stat) -> str:
+    if images.CONTENT_NAME.match(name):
+        return f'"{name}"'  # the name is derived from the content
+    return f'"{name}-{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+def _if_none_match(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = [value.strip() for value in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+@router.get("/{file_name}")
+async def get_image(file_name: str, request: Request):
+    if not SAFE_NAME.match(file_name):
+        raise HTTPException(status_code=404, detail="Image not found")
+
+    name, stat = _negotiate(file_name, request.headers.get("accept", ""))
+    etag = _etag(name, stat)
+    headers = {
+        "ETag": etag,
+        "Cache-Control": images.IMMUTABLE_CACHE_CONTROL if images.CONTENT_NAME.match(name) else LEGACY_CACHE_CONTROL,
+        "Vary": "Accept",
+    }
+    if _if_none_match(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    media_type = MEDIA_TYPES[name.rsplit(".", 1)[1]]
+    if ACCEL_REDIRECT_PREFIX:
+        headers["X-Accel-Redirect"] = ACCEL_REDIRECT_PREFIX + name
+        return Response(media_type=media_type, headers=headers)
+    return FileResponse(
+        os.path.join(images.IMAGEDIR, name),
+        media_type=media_type,
+        headers=headers,
+        stat_result=stat,
+    )
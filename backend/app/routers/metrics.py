@@ -0,0 +1,12 @@
+from fastapi import APIRouter, Depends
+from .. import auth, metrics
+
+router = APIRouter(
+    prefix="/api/metrics",
+    tags=["metrics"]
+)
+
+@router.get("/")
+def read_metrics(current_user: auth.Principal = Depends(auth.get_current_admin_user)):
+    """Per-process runtime metrics (connection pool, session lifecycle)"""
+    return metrics.snapshot()
@@ -2,11 +2,13 @@
 Router for Reviews & Ratings
 Handles review submission, retrieval, and moderate
 """
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
+from sqlalchemy import case, select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List
-from .. import models, schemas_extended, auth
-from ..database import get_db
+from typing import List, Optional
+from .. import models, schemas_extended, auth, pagination, ratings, response_cache
+from ..database import get_db, get_async_db
 
 router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 
@@ -14,7 +16,7 @@ router = APIRouter(prefix="/api/reviews", tags=["reviews"])
 def create_review(
     review: schemas_extended.ReviewCreate,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Create a review for a room after completing a booking"""
     # Verify booking exists and belongs to current user
@@ -52,41 +54,66 @@ def create_review(
     )
     
     db.add(db_review)
+    db.flush()
+    if db_review.is_approved:
+        ratings.record_review(db, db_review.room_id, db_review.rating, +1)
     db.commit()
+    response_cache.invalidate(*response_cache.review_tags(db_review.room_id))
     db.refresh(db_review)
     
     return db_review
 
+# sort key -> (keyset columns, descending)
+REVIEW_SORTS = {
+    "newest": ((models.Review.created_at, models.Review.id), True),
+    "highest": ((models.Review.rating, models.Review.id), True),
+    "lowest": ((models.Review.rating, models.Review.id), False),
+}
+
 @router.get("/room/{room_id}", response_model=List[schemas_extended.ReviewWithUser])
-def get_room_reviews(
+async def get_room_reviews(
     room_id: int,
+    response: Response,
     skip: int = 0,
-    limit: int = 20,
-    db: Session = Depends(get_db)
+    limit: int = Query(20, ge=1, le=100),
+    sort: str = Query("newest", pattern="^(newest|highest|lowest)$"),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_async_db)
 ):
-    """Get all approved reviews for a specific room"""
-    reviews = db.query(models.Review).filter(
+    """Get approved reviews for a specific room with reviewer info (single query).
+    Pass the X-Next-Cursor response header back as `cursor` for the next page."""
+    columns, descending = REVIEW_SORTS[sort]
+    query = select(
+        *models.Review.__table__.columns,
+        case((models.User.id.is_(None), "Anonymous"), else_=models.User.full_name).label("user_name"),
+        models.User.email.label("user_email")
+    ).outerjoin(
+        models.User, models.User.id == models.Review.user_id
+    ).where(
         models.Review.room_id == room_id,
         models.Review.is_approved == True
-    ).offset(skip).limit(limit).all()
+    ).order_by(*pagination.keyset_order(columns, descending))
+    
+    if cursor:
+        try:
+            position = pagination.cursor_position(cursor, sort, columns)
+        except pagination.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.where(pagination.keyset_filter(columns, position, descending))
+    else:
+        query = query.offset(skip)
     
-    # Enhance with user info
-    result = []
-    for review in reviews:
-        user = db.query(models.User).filter(models.User.id == review.user_id).first()
-        review_dict = {
-            **review.__dict__,
-            "user_name": user.full_name if user else "Anonymous",
-            "user_email": user.email if user else None
-        }
-        result.append(review_dict)
+    rows = (await db.execute(query.limit(limit + 1))).all()
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers[pagination.NEXT_CURSOR_HEADER] = pagination.page_cursor(sort, columns, rows[-1])
     
-    return result
+    return [schemas_extended.ReviewWithUser.model_validate(row) for row in rows]
 
 @router.get("/user/my-reviews", response_model=List[schemas_extended.ReviewResponse])
 def get_my_reviews(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Get all reviews submitted by current user"""
     reviews = db.query(models.Review).filter(
@@ -101,7 +128,7 @@ def moderate_review(
     is_approved: bool,
     is_flagged: bool = False,
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(auth.get_current_user)
+    current_user: auth.Principal = Depends(auth.get_current_user)
 ):
     """Moderate a review (admin only)"""
     if current_user.role != "admin":
@@ -114,8 +141,11 @@ def moderate_review(
     if not review:
         raise HTTPException(status_code=404, detail="Review not found")
     
+    if review.is_approved != is_approved:
+        ratings.record_review(db, review.room_id, review.rating, +1 if is_approved else -1)
     review.is_approved = is_approved
     review.is_flagged = is_flagged
     db.commit()
+    response_cache.invalidate(*response_cache.review_tags(review.room_id))
     
     return {"message": "Review moderated successfully"}
@@ -1,25 +1,42 @@
-from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, Query
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi import APIRouter, Depends, UploadFile, File, Form, HTTPException, status, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, joinedload
+from sqlalchemy import and_, or_, select, func, true
 from typing import List, Optional
-from .. import schemas, database, crud, auth, models
-import shutil
-import os
-import uuid
+from datetime import date
+from .. import schemas, database, crud, auth, models, pagination, inventory, pricing, geo, fulltext, images, gallery
 import json
+import math
 
 router = APIRouter(
     prefix="/rooms",
     tags=["rooms"]
 )
 
-IMAGEDIR = "static/images/"
+# sort key -> (keyset columns, descending); each is backed by an index on Room
+ROOM_SORTS = {
+    "id": ((models.Room.id,), False),
+    "price_asc": ((models.Room.price, models.Room.id), False),
+    "price_desc": ((models.Room.price, models.Room.id), True),
+    "rating": ((models.Room.average_rating, models.Room.id), True),
+}
+
+# Map search pages through at most this many nearest rooms; candidates are
+# fetched in approximate distance order with MAP_CANDIDATE_SLACK extra rows
+# so the exact haversine re-sort can only move rooms at the page boundary
+MAP_MAX_RESULTS = 1000
+MAP_CANDIDATE_SLACK = 50
 
 @router.get("/", response_model=List[schemas.RoomResponse])
-def read_rooms(
+async def read_rooms(
+    response: Response,
     skip: int = 0,
-    limit: int = 100,
+    limit: int = Query(100, ge=1, le=500),
+    sort: Optional[str] = Query(None, pattern="^(id|price_asc|price_desc|rating)$"),
+    cursor: Optional[str] = Query(None),
     # Filters
+    q: Optional[str] = Query(None, max_length=200),
     property_type: Optional[str] = Query(None),
     min_price: Optional[float] = Query(None),
     max_price: Optional[float] = Query(None),
@@ -30,18 +47,42 @@ def read_rooms(
     booking_options: Optional[str] = Query(None),  # Comma-separated list
     is_guest_favourite: Optional[bool] = Query(None),
     is_luxe: Optional[bool] = Query(None),
-    db: Session = Depends(database.get_db)
+    start_date: Optional[date] = Query(None),
+    end_date: Optional[date] = Query(None),
+    guests: Optional[int] = Query(None, ge=1),
+    # Map search
+    near_lat: Optional[float] = Query(None, ge=-90, le=90),
+    near_lng: Optional[float] = Query(None, ge=-180, le=180),
+    radius_km: float = Query(10, gt=0, le=500),
+    bbox: Optional[str] = Query(None),  # "west,south,east,north"
+    db: AsyncSession = Depends(database.get_async_db)
 ):
     """
     Get rooms with optional filters:
+    - q: full-text search over title, description and location; results are
+      ranked by relevance unless an explicit sort is given
     - property_type: house, apartment, room, guest_house
     - min_price, max_price: price range
     - bedrooms, beds, bathrooms: minimum count
     - amenities: comma-separated (e.g., "wifi,pool,ac")
     - booking_options: comma-separated (e.g., "instant_book,self_checkin")
     - is_guest_favourite, is_luxe: special categories
+    - start_date, end_date: only rooms free for every night of the stay
+      (no overlapping booking, no blocked calendar day); each room then
+      carries stay_total priced with per-date overrides and discounts
+    - guests: minimum max_guests
+    
+    Map search (results sorted by distance, distance_km set; pages with skip,
+    sort/cursor are rejected, at most 1000 results in total):
+    - near_lat, near_lng, radius_km: rooms within radius_km of the point
+    - bbox: rooms inside "west,south,east,north", by distance from its center
+    
+    Pagination:
+    - sort: id (default), price_asc, price_desc, rating
+    - cursor: value of the X-Next-Cursor header from the previous page
+      (keyset pagination; takes precedence over skip)
     """
-    query = db.query(models.Room).filter(models.Room.is_deleted == False)
+    query = select(models.Room).filter(models.Room.is_deleted == False)
     
     # Apply filters
     if property_type:
@@ -68,26 +109,156 @@ def read_rooms(
     if is_luxe is not None:
         query = query.filter(models.Room.is_luxe == is_luxe)
     
-    # Get results
-    rooms = query.offset(skip).limit(limit).all()
+    if guests is not None:
+        query = query.filter(models.Room.max_guests >= guests)
+    
+    if start_date or end_date:
+        if not (start_date and end_date) or end_date <= start_date:
+            raise HTTPException(status_code=400, detail="Provide start_date and end_date with end_date after start_date")
+        if (end_date - start_date).days > pricing.MAX_STAY_NIGHTS:
+            raise HTTPException(status_code=400, detail=f"Stays are limited to {pricing.MAX_STAY_NIGHTS} nights")
+        query = query.filter(inventory.free_between(start_date, end_date))
     
-    # Filter by amenities and booking options in Python (since JSON filtering in SQLite is limited)
+    # Amenities and booking options are matched through the room_features index
+    # so that filtering happens before pagination
     if amenities:
-        required_amenities = set(amenities.split(','))
-        rooms = [room for room in rooms if room.amenities and required_amenities.issubset(set(room.amenities))]
+        query = query.filter(_has_all_features(crud.FEATURE_AMENITY, amenities))
     
     if booking_options:
-        required_options = set(booking_options.split(','))
-        rooms = [room for room in rooms if room.booking_options and required_options.issubset(set(room.booking_options))]
+        query = query.filter(_has_all_features(crud.FEATURE_BOOKING_OPTION, booking_options))
+    
+    rank = None
+    if q and q.strip():
+        query, rank = fulltext.apply(query, database.async_engine.dialect.name, q.strip())
+    
+    if bbox or near_lat is not None or near_lng is not None:
+        if sort or cursor:
+            raise HTTPException(status_code=400, detail="sort and cursor are not supported in map search; results are ordered by distance")
+        if skip + limit > MAP_MAX_RESULTS:
+            raise HTTPException(status_code=400, detail=f"Map search returns at most {MAP_MAX_RESULTS} rooms; narrow the area")
+        query, origin, max_distance = _map_area(query, bbox, near_lat, near_lng, radius_km)
+        query = query.order_by(_approximate_distance(origin), models.Room.id).limit(skip + limit + MAP_CANDIDATE_SLACK)
+        candidates = (await db.execute(query)).scalars().all()
+        rooms = _by_distance(candidates, origin, max_distance)[skip:skip + limit]
+        if start_date and end_date:
+            await _attach_stay_totals(db, rooms, start_date, end_date)
+        return rooms
+    
+    if rank is not None and sort is None:
+        # Relevance order has no stable keyset; page with skip
+        query = query.order_by(rank, models.Room.id).offset(skip).limit(limit)
+        rooms = (await db.execute(query)).scalars().all()
+        if start_date and end_date:
+            await _attach_stay_totals(db, rooms, start_date, end_date)
+        return rooms
+    
+    sort = sort or "id"
+    columns, descending = ROOM_SORTS[sort]
+    query = query.order_by(*pagination.keyset_order(columns, descending))
+    if cursor:
+        try:
+            position = pagination.cursor_position(cursor, sort, columns)
+        except pagination.InvalidCursor as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        query = query.filter(pagination.keyset_filter(columns, position, descending))
+    else:
+        query = query.offset(skip)
     
+    # Fetch one extra row to know whether another page exists
+    rooms = (await db.execute(query.limit(limit + 1))).scalars().all()
+    if len(rooms) > limit:
+        rooms = rooms[:limit]
+        response.headers[pagination.NEXT_CURSOR_HEADER] = pagination.page_cursor(sort, columns, rooms[-1])
+    
+    if start_date and end_date:
+        await _attach_stay_totals(db, rooms, start_date, end_date)
+    
+    return rooms
+
+async def _attach_stay_totals(db: AsyncSession, rooms: List[models.Room], start_date: date, end_date: date):
+    stays = [pricing.Stay(room.id, start_date, end_date) for room in rooms]
+    quotes = await pricing.quote_stays_async(db, stays, rooms={room.id: room for room in rooms})
+    for room, quote in zip(rooms, quotes):
+        room.stay_total = quote.total
+
+def _map_area(query, bbox: Optional[str], near_lat: Optional[float], near_lng: Optional[float], radius_km: float):
+    """Restrict query to geohash cells covering the map area.
+    Returns (query, origin, max_distance) for _by_distance."""
+    if bbox:
+        box = geo.parse_bbox(bbox)
+        if box is None:
+            raise HTTPException(status_code=400, detail="bbox must be 'west,south,east,north' in degrees")
+        origin = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+        max_distance = None
+    else:
+        if near_lat is None or near_lng is None:
+            raise HTTPException(status_code=400, detail="Provide both near_lat and near_lng")
+        origin = (near_lat, near_lng)
+        box = geo.box_around(near_lat, near_lng, radius_km)
+        max_distance = radius_km
+    
+    min_lat, min_lng, max_lat, max_lng = box
+    cells = [geo.prefix_range(cell) for cell in geo.cover(box)]
+    query = query.filter(
+        or_(*[and_(models.Room.geohash >= low, models.Room.geohash < high) for low, high in cells]),
+        models.Room.latitude.between(min_lat, max_lat),
+        models.Room.longitude.between(min_lng, max_lng)
+    )
+    return query, origin, max_distance
+
+def _approximate_distance(origin):
+    """Squared equirectangular distance (in degrees) from origin, for ordering
+    candidates in SQL without trigonometric functions"""
+    lng_scale = math.cos(math.radians(origin[0]))
+    d_lat = models.Room.latitude - origin[0]
+    d_lng = (models.Room.longitude - origin[1]) * lng_scale
+    return d_lat * d_lat + d_lng * d_lng
+
+def _by_distance(candidates: List[models.Room], origin, max_distance: Optional[float]):
+    """Exact distance check and nearest-first sort of the geohash candidates"""
+    rooms = []
+    for room in candidates:
+        room.distance_km = round(geo.haversine_km(origin[0], origin[1], room.latitude, room.longitude), 3)
+        if max_distance is None or room.distance_km <= max_distance:
+            rooms.append(room)
+    rooms.sort(key=lambda room: (room.distance_km, room.id))
     return rooms
 
-@router.get("/{room_id}", response_model=schemas.RoomResponse)
-def read_room(room_id: int, db: Session = Depends(database.get_db)):
-    room = db.query(models.Room).filter(
+def _has_all_features(kind: str, csv_values: str):
+    """Room.id IN (rooms that carry every one of the comma-separated values)"""
+    values = {value.strip() for value in csv_values.split(',') if value.strip()}
+    if not values:
+        return true()
+    matching_rooms = (
+        select(models.RoomFeature.room_id)
+        .where(
+            models.RoomFeature.kind == kind,
+            models.RoomFeature.value.in_(values)
+        )
+        .group_by(models.RoomFeature.room_id)
+        .having(func.count(models.RoomFeature.value) == len(values))
+    )
+    return models.Room.id.in_(matching_rooms)
+
+@router.post("/quotes", response_model=List[schemas.StayQuote])
+def quote_stays(batch: schemas.StayQuoteBatch, db: Session = Depends(database.get_db)):
+    """Quote many room x date-range stays at once (per-date overrides and long-stay discounts)"""
+    stays = [pricing.Stay(stay.room_id, stay.start_date, stay.end_date) for stay in batch.stays]
+    if any((stay.end_date - stay.start_date).days > pricing.MAX_STAY_NIGHTS for stay in stays):
+        raise HTTPException(status_code=400, detail=f"Stays are limited to {pricing.MAX_STAY_NIGHTS} nights")
+    quotes = pricing.quote_stays(db, stays)
+    missing = [stay.room_id for stay, quote in zip(stays, quotes) if quote is None]
+    if missing:
+        raise HTTPException(status_code=404, detail=f"Rooms not found: {sorted(set(missing))}")
+    return [{**quote._asdict(), "nights": quote.nights} for quote in quotes]
+
+@router.get("/{room_id}", response_model=schemas.RoomDetailResponse)
+async def read_room(room_id: int, db: AsyncSession = Depends(database.get_async_db)):
+    query = select(models.Room).options(joinedload(models.Room.rating_stats)).filter(
         models.Room.id == room_id,
         models.Room.is_deleted == False
-    ).first()
+    )
+    room = (await db.execute(query)).scalar_one_or_none()
     if not room:
         raise HTTPException(status_code=404, detail="Room not found")
     return room
@@ -98,7 +269,11 @@ async def create_room(
     description: str = Form(None),
     price: float = Form(...),
     original_price: float = Form(None),
+    weekly_discount: float = Form(None, ge=0, le=100),
+    monthly_discount: float = Form(None, ge=0, le=100),
     location: str = Form(None),
+    latitude: float = Form(None),
+    longitude: float = Form(None),
     property_type: str = Form("room"),
     bedrooms: int = Form(1),
     beds: int = Form(1),
@@ -110,23 +285,10 @@ async def create_room(
     is_luxe: str = Form("false"),  # Changed to str for FormData
     file: UploadFile = File(None),
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_admin_user)
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
 ):
     try:
-        image_url = None
-        if file:
-            # Preserve file extension (jpg, jpeg, png)
-            file_ext = file.filename.split('.')[-1].lower() if '.' in file.filename else 'jpg'
-            if file_ext not in ['jpg', 'jpeg', 'png']:
-                file_ext = 'jpg'  # Default to jpg for unsupported types
-            file.filename = f"{uuid.uuid4()}.{file_ext}"
-            contents = await file.read()
-            
-            os.makedirs(IMAGEDIR, exist_ok=True)
-            
-            with open(f"{IMAGEDIR}{file.filename}", "wb") as f:
-                f.write(contents)
-            image_url = f"/static/images/{file.filename}"
+        image = await _store_upload(file) if file and file.filename else None
 
         # Parse JSON strings
         amenities_list = json.loads(amenities) if amenities else []
@@ -141,7 +303,11 @@ async def create_room(
             description=description,
             price=price,
             original_price=original_price,
+            weekly_discount=weekly_discount,
+            monthly_discount=monthly_discount,
             location=location,
+            latitude=latitude,
+            longitude=longitude,
             property_type=property_type,
             bedrooms=bedrooms,
             beds=beds,
@@ -152,7 +318,9 @@ async def create_room(
             is_guest_favourite=is_guest_favourite_bool,
             is_luxe=is_luxe_bool
         )
-        return crud.create_room(db=db, room=room_data, image_url=image_url, host_id=current_user.id)
+        return await run_in_threadpool(_write_room, crud.create_room, db, room_data, image, current_user.id)
+    except HTTPException:
+        raise
     except json.JSONDecodeError as e:
         raise HTTPException(status_code=400, detail=f"Invalid JSON in amenities or booking_options: {str(e)}")
     except Exception as e:
@@ -170,7 +338,11 @@ async def update_room(
     description: str = Form(None),
     price: float = Form(None),
     original_price: float = Form(None),
+    weekly_discount: float = Form(None, ge=0, le=100),
+    monthly_discount: float = Form(None, ge=0, le=100),
     location: str = Form(None),
+    latitude: float = Form(None),
+    longitude: float = Form(None),
     property_type: str = Form(None),
     bedrooms: int = Form(None),
     beds: int = Form(None),
@@ -182,67 +354,117 @@ async def update_room(
     is_luxe: bool = Form(None),
     file: UploadFile = File(None),
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_admin_user)
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
 ):
     # Get existing room
-    db_room = db.query(models.Room).filter(
-        models.Room.id == room_id,
-        models.Room.is_deleted == False
-    ).first()
-    
-    if not db_room:
-        raise HTTPException(status_code=404, detail="Room not found")
+    db_room = await run_in_threadpool(_active_room, db, room_id)
     
     # Handle image upload if provided
-    if file and file.filename:
-        file.filename = f"{uuid.uuid4()}.jpg"
-        contents = await file.read()
-        os.makedirs(IMAGEDIR, exist_ok=True)
-        with open(f"{IMAGEDIR}{file.filename}", "wb") as f:
-            f.write(contents)
-        db_room.image_url = f"/static/images/{file.filename}"
+    image = await _store_upload(file) if file and file.filename else None
     
     # Update fields if provided
-    if title is not None:
-        db_room.title = title
-    if description is not None:
-        db_room.description = description
-    if price is not None:
-        db_room.price = price
-    if original_price is not None:
-        db_room.original_price = original_price
-    if location is not None:
-        db_room.location = location
-    if property_type is not None:
-        db_room.property_type = property_type
-    if bedrooms is not None:
-        db_room.bedrooms = bedrooms
-    if beds is not None:
-        db_room.beds = beds
-    if bathrooms is not None:
-        db_room.bathrooms = bathrooms
-    if max_guests is not None:
-        db_room.max_guests = max_guests
+    fields = {
+        "title": title,
+        "description": description,
+        "price": price,
+        "original_price": original_price,
+        "weekly_discount": weekly_discount,
+        "monthly_discount": monthly_discount,
+        "location": location,
+        "latitude": latitude,
+        "longitude": longitude,
+        "property_type": property_type,
+        "bedrooms": bedrooms,
+        "beds": beds,
+        "bathrooms": bathrooms,
+        "max_guests": max_guests,
+        "is_guest_favourite": is_guest_favourite,
+        "is_luxe": is_luxe,
+    }
     if amenities is not None:
-        db_room.amenities = json.loads(amenities) if amenities else []
+        fields["amenities"] = json.loads(amenities) if amenities else []
     if booking_options is not None:
-        db_room.booking_options = json.loads(booking_options) if booking_options else []
-    if is_guest_favourite is not None:
-        db_room.is_guest_favourite = is_guest_favourite
-    if is_luxe is not None:
-        db_room.is_luxe = is_luxe
+        fields["booking_options"] = json.loads(booking_options) if booking_options else []
+    room_update = schemas.RoomUpdate(**{key: value for key, value in fields.items() if value is not None})
     
-    db.commit()
-    db.refresh(db_room)
-    return db_room
+    return await run_in_threadpool(_write_room, crud.apply_room_update, db, db_room, room_update, image)
+
+async def _store_upload(file: UploadFile) -> images.SavedUpload:
+    try:
+        return await images.save_upload(file)
+    except images.ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except images.InvalidImage as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def _write_room(write, db: Session, *args):
+    """Run a crud room write. The async upload handlers call this through
+    run_in_threadpool so Session and file work stays off the event loop."""
+    try:
+        return write(db, *args)
+    except gallery.ImageCollected as e:
+        db.rollback()
+        raise HTTPException(status_code=409, detail=str(e))
+    except gallery.GalleryError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.delete("/{room_id}")
 def delete_room(
     room_id: int,
     db: Session = Depends(database.get_db),
-    current_user: models.User = Depends(auth.get_current_admin_user)
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
 ):
     db_room = crud.delete_room(db, room_id=room_id)
     if not db_room:
         raise HTTPException(status_code=404, detail="Room not found")
     return {"message": "Room deleted successfully"}
+
+def _active_room(db: Session, room_id: int) -> models.Room:
+    db_room = db.query(models.Room).filter(
+        models.Room.id == room_id,
+        models.Room.is_deleted == False
+    ).first()
+    if not db_room:
+        raise HTTPException(status_code=404, detail="Room not found")
+    return db_room
+
+@router.post("/{room_id}/images", response_model=schemas.RoomResponse)
+async def add_room_images(
+    room_id: int,
+    files: List[UploadFile] = File(...),
+    db: Session = Depends(database.get_db),
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
+):
+    """Append images to the room's gallery (identical files are stored once)"""
+    db_room = await run_in_threadpool(_active_room, db, room_id)
+    uploads = [await _store_upload(file) for file in files]
+    return await run_in_threadpool(_write_room, crud.add_room_images, db, db_room, uploads)
+
+@router.delete("/{room_id}/images/{image_id}", response_model=schemas.RoomResponse)
+def remove_room_image(
+    room_id: int,
+    image_id: str,
+    db: Session = Depends(database.get_db),
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
+):
+    """Remove an image (by file name) from the room's gallery"""
+    db_room = _active_room(db, room_id)
+    try:
+        return crud.remove_room_image(db, db_room, image_id)
+    except gallery.ImageNotInGallery as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@router.put("/{room_id}/images/order", response_model=schemas.RoomResponse)
+def reorder_room_images(
+    room_id: int,
+    order: schemas.GalleryOrder,
+    db: Session = Depends(database.get_db),
+    current_user: auth.Principal = Depends(auth.get_current_admin_user)
+):
+    """Set the gallery order; image_ids must list every gallery image once"""
+    db_room = _active_room(db, room_id)
+    try:
+        return crud.reorder_room_images(db, db_room, order.image_ids)
+    except gallery.GalleryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
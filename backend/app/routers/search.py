@@ -0,0 +1,17 @@
+"""
+Router for search autocomplete
+Served from the in-memory prefix index in suggest.py (no database access)
+"""
+from fastapi import APIRouter, Query
+from typing import List
+from .. import schemas_extended, suggest
+
+router = APIRouter(prefix="/api/search", tags=["search"])
+
+@router.get("/suggest", response_model=List[schemas_extended.SearchSuggestion])
+async def suggest_search(
+    q: str = Query(..., min_length=1, max_length=100),
+    limit: int = Query(8, ge=1, le=20)
+):
+    """Location, property type and title suggestions for a typed prefix"""
+    return suggest.index.search(q, limit)
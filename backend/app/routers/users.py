@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends
-from .. import schemas, auth, models
+from .. import schemas, auth
 
 router = APIRouter(
     prefix="/users",
@@ -7,5 +7,5 @@ router = APIRouter(
 )
 
 @router.get("/me", response_model=schemas.UserResponse)
-def read_users_me(current_user: models.User = Depends(auth.get_current_user)):
+def read_users_me(current_user: auth.Principal = Depends(auth.get_current_user)):
     return current_user
@@ -1,6 +1,6 @@
-from pydantic import BaseModel, EmailStr, field_validator
-from typing import Optional, List
-from datetime import datetime
+from pydantic import BaseModel, EmailStr, Field, field_validator
+from typing import Optional, List, Dict
+from datetime import datetime, date
 import re
 
 # Token
@@ -54,7 +54,11 @@ class RoomBase(BaseModel):
     description: Optional[str] = None
     price: float
     original_price: Optional[float] = None
+    weekly_discount: Optional[float] = Field(None, ge=0, le=100)
+    monthly_discount: Optional[float] = Field(None, ge=0, le=100)
     location: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     property_type: Optional[str] = "room"
     bedrooms: Optional[int] = 1
     beds: Optional[int] = 1
@@ -74,7 +78,11 @@ class RoomUpdate(BaseModel):
     description: Optional[str] = None
     price: Optional[float] = None
     original_price: Optional[float] = None
+    weekly_discount: Optional[float] = Field(None, ge=0, le=100)
+    monthly_discount: Optional[float] = Field(None, ge=0, le=100)
     location: Optional[str] = None
+    latitude: Optional[float] = None
+    longitude: Optional[float] = None
     property_type: Optional[str] = None
     bedrooms: Optional[int] = None
     beds: Optional[int] = None
@@ -89,12 +97,57 @@ class RoomUpdate(BaseModel):
 class RoomResponse(RoomBase):
     id: int
     image_url: Optional[str] = None
+    thumbnail_url: Optional[str] = None
     images: Optional[List[str]] = []
     host_id: Optional[int] = None
+    average_rating: Optional[float] = None
+    review_count: Optional[int] = None
+    stay_total: Optional[float] = None  # Set when searching with start_date/end_date
+    distance_km: Optional[float] = None  # Set by map search
 
     class Config:
         from_attributes = True
 
+class RoomDetailResponse(RoomResponse):
+    rating_histogram: Dict[str, int] = {}
+
+class GalleryOrder(BaseModel):
+    image_ids: List[str]  # gallery image file names, in display order
+
+# Pricing
+class StayQuoteRequest(BaseModel):
+    room_id: int
+    start_date: date
+    end_date: date
+
+    @field_validator('end_date')
+    @classmethod
+    def validate_dates(cls, v, info):
+        start_date = info.data.get('start_date')
+        if start_date and v <= start_date:
+            raise ValueError('end_date must be after start_date')
+        return v
+
+class StayQuoteBatch(BaseModel):
+    stays: List[StayQuoteRequest]
+
+    @field_validator('stays')
+    @classmethod
+    def validate_size(cls, v):
+        if len(v) > 500:
+            raise ValueError('At most 500 stays can be quoted at once')
+        return v
+
+class StayQuote(BaseModel):
+    room_id: int
+    start_date: date
+    end_date: date
+    nights: int
+    nightly_rates: List[float]
+    subtotal: float
+    discount: float
+    total: float
+
 # Booking
 class BookingBase(BaseModel):
     room_id: int
@@ -109,6 +162,7 @@ class BookingResponse(BookingBase):
     id: int
     user_id: int
     total_price: float
+    nightly_rates: Optional[List[float]] = None
     status: str
     payment_method: Optional[str] = None
     payment_status: Optional[str] = None
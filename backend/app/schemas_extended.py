@@ -3,10 +3,12 @@ Extended schemas for Phase 1 OTA features:
 - Reviews & Ratings
 - Booking Modifications
 - Room Availability (Calendar)
+- Booking Analytics
 """
 from pydantic import BaseModel, EmailStr, validator
 from typing import Optional, List
 from datetime import datetime, date
+from .schemas import BookingResponse, RoomResponse
 
 # Review Schemas
 class ReviewBase(BaseModel):
@@ -56,13 +58,67 @@ class RoomAvailabilityUpdate(BaseModel):
     notes: Optional[str] = None
 
 class RoomAvailabilityResponse(RoomAvailabilityBase):
-    id: int
+    id: int  # of the calendar range containing this date
     room_id: int
     created_at: datetime
     
     class Config:
         from_attributes = True
 
+class CalendarRange(BaseModel):
+    start_date: date
+    end_date: date  # inclusive
+    is_available: bool
+    price_override: Optional[float] = None
+    notes: Optional[str] = None
+
+class CalendarRangesResponse(BaseModel):
+    room_id: int
+    start_date: date
+    end_date: date
+    ranges: List[CalendarRange]
+
+class AvailabilityHeatmap(BaseModel):
+    """Columnar: entry i of every list is room_ids[i]. Bitsets are base64,
+    bit d (byte d // 8, least significant bit first) is day start_date + d"""
+    start_date: date
+    end_date: date  # inclusive
+    days: int
+    room_ids: List[int]
+    base_prices: List[float]
+    available: List[str]  # bookable: not booked, not blocked, room listed
+    booked: List[str]
+    blocked: List[str]
+    prices: List[List[float]]  # nightly price: calendar override or base price
+
+class CalendarRangeChange(BaseModel):
+    """Fields left out keep their current value; send price_override: null to clear it"""
+    start_date: date
+    end_date: date  # inclusive
+    is_available: Optional[bool] = None
+    price_override: Optional[float] = None
+    notes: Optional[str] = None
+
+class CalendarBulkUpdate(BaseModel):
+    room_ids: List[int]
+    changes: List[CalendarRangeChange]
+
+    @validator('room_ids')
+    def validate_room_ids(cls, v):
+        if not 1 <= len(v) <= 500:
+            raise ValueError('room_ids must list between 1 and 500 rooms')
+        return v
+
+    @validator('changes')
+    def validate_changes(cls, v):
+        if not 1 <= len(v) <= 50:
+            raise ValueError('changes must list between 1 and 50 changes')
+        return v
+
+class CalendarBulkResult(BaseModel):
+    rooms: int
+    days_written: int
+
 # Booking Modification Schemas
 class BookingModificationCreate(BaseModel):
     new_start_date: Optional[datetime] = None
@@ -88,6 +144,15 @@ class BookingModificationResponse(BaseModel):
     class Config:
         from_attributes = True
 
+class BookingWithDetails(BookingResponse):
+    """Entry of GET /bookings/; room and review are filled in when requested with include="""
+    cancellation_policy: Optional[str] = None
+    cancelled_at: Optional[datetime] = None
+    refund_amount: Optional[float] = None
+    created_at: Optional[datetime] = None
+    room: Optional[RoomResponse] = None
+    review: Optional[ReviewResponse] = None
+
 # Booking Cancellation Schema
 class BookingCancellation(BaseModel):
     cancellation_reason: Optional[str] = None
@@ -99,6 +164,37 @@ class CancellationResponse(BaseModel):
     cancellation_policy: str
     message: str
 
+class BulkCancellation(BaseModel):
+    """Selects the bookings on room_ids and/or with a night in [start_date, end_date)"""
+    room_ids: Optional[List[int]] = None
+    start_date: Optional[date] = None
+    end_date: Optional[date] = None
+    cancellation_reason: str
+    full_refund: bool = False  # refund 100% whatever the policy, e.g. the property is unusable
+    dry_run: bool = False  # report the refunds without cancelling anything
+
+# Booking Analytics Schemas
+class AnalyticsMetrics(BaseModel):
+    nights_sold: int
+    available_nights: int  # rooms x days
+    occupancy_rate: float  # nights_sold / available_nights
+    revenue: float
+    adr: float  # average daily rate: revenue / nights_sold
+    cancellations: int
+    refunds: float
+
+class AnalyticsSummary(AnalyticsMetrics):
+    start_date: date
+    end_date: date
+    days: int
+    rooms: int
+
+class AnalyticsDay(AnalyticsMetrics):
+    day: date
+
+class AnalyticsRoom(AnalyticsMetrics):
+    room_id: int
+
 # Extended Room Schema with coordinates
 class RoomCreateExtended(BaseModel):
     title: str
@@ -132,7 +228,7 @@ class RoomResponseExtended(RoomCreateExtended):
 
 # Search Autocomplete Schema
 class SearchSuggestion(BaseModel):
-    type: str  # "location", "property", "destination"
+    type: str  # "location", "property", "title"
     value: str
     display_text: str
     metadata: Optional[dict] = None
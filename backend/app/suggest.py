@@ -0,0 +1,185 @@
+"""
+In-memory prefix index for search autocomplete.
+Built from Room.location / Room.property_type / Room.title at startup and kept
+current by crud.create_room / update_room / delete_room, so keystrokes never hit
+the database. Each phrase is indexed at every word start ("Indiranagar,
+Bangalore" matches both "ind" and "ban") in a sorted list per kind searched
+with bisect. Kinds are scanned in rank order, each up to MAX_SCAN keys, so a
+prefix shared by many titles cannot crowd out locations.
+
+Every worker process holds its own copy; writes handled by other workers are
+picked up by the periodic rebuild (SUGGEST_REFRESH_SECONDS). A rebuild sorts
+all keys once; room changes made while it reads the table are journaled and
+replayed onto the fresh index when it is swapped in.
+"""
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+from sqlalchemy.orm import Session
+from . import models
+
+REFRESH_SECONDS = int(os.getenv("SUGGEST_REFRESH_SECONDS", 300))
+MAX_SCAN = 200
+
+# Lower rank sorts first
+KIND_RANK = {"location": 0, "property": 1, "title": 2}
+
+_WORD_START = re.compile(r"\w+")
+
+def normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+def _keys(text: str) -> List[str]:
+    normalized = normalize(text)
+    return sorted({normalized[match.start():] for match in _WORD_START.finditer(normalized)})
+
+def _room_entries(room: models.Room) -> Set[Tuple[str, str]]:
+    entries = set()
+    if room.is_deleted:
+        return entries
+    if room.location:
+        entries.add(("location", room.location.strip()))
+    if room.property_type:
+        entries.add(("property", room.property_type.strip()))
+    if room.title:
+        entries.add(("title", room.title.strip()))
+    return entries
+
+class PrefixIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._keys: Dict[str, List[Tuple[str, str]]] = {kind: [] for kind in KIND_RANK}  # kind -> sorted (key, value)
+        self._rooms_by_entry: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self._entries_by_room: Dict[int, Set[Tuple[str, str]]] = {}
+        # (room_id, entries) changes made while a rebuild is running
+        self._journal: Optional[List[Tuple[int, Set[Tuple[str, str]]]]] = None
+
+    @classmethod
+    def build(cls, rooms: Iterable) -> "PrefixIndex":
+        """Index many rooms at once, sorting the keys a single time"""
+        built = cls()
+        for room in rooms:
+            entries = _room_entries(room)
+            if entries:
+                built._entries_by_room[room.id] = entries
+                for entry in entries:
+                    built._rooms_by_entry[entry].add(room.id)
+        keys = defaultdict(set)
+        for kind, value in built._rooms_by_entry:
+            keys[kind].update((key, value) for key in _keys(value))
+        for kind, kind_keys in keys.items():
+            built._keys[kind] = sorted(kind_keys)
+        return built
+
+    def _add_entry(self, entry: Tuple[str, str], room_id: int):
+        rooms = self._rooms_by_entry[entry]
+        if not rooms:
+            kind, value = entry
+            for key in _keys(value):
+                insort(self._keys[kind], (key, value))
+        rooms.add(room_id)
+
+    def _remove_entry(self, entry: Tuple[str, str], room_id: int):
+        rooms = self._rooms_by_entry.get(entry)
+        if not rooms:
+            return
+        rooms.discard(room_id)
+        if not rooms:
+            del self._rooms_by_entry[entry]
+            kind, value = entry
+            keys = self._keys[kind]
+            for key in _keys(value):
+                position = bisect_left(keys, (key, value))
+                if position < len(keys) and keys[position] == (key, value):
+                    del keys[position]
+
+    def _set_entries(self, room_id: int, entries: Set[Tuple[str, str]]):
+        previous = self._entries_by_room.get(room_id, set())
+        for entry in previous - entries:
+            self._remove_entry(entry, room_id)
+        for entry in entries - previous:
+            self._add_entry(entry, room_id)
+        if entries:
+            self._entries_by_room[room_id] = entries
+        else:
+            self._entries_by_room.pop(room_id, None)
+        if self._journal is not None:
+            self._journal.append((room_id, entries))
+
+    def upsert_room(self, room: models.Room):
+        entries = _room_entries(room)
+        with self._lock:
+            self._set_entries(room.id, entries)
+
+    def remove_room(self, room_id: int):
+        with self._lock:
+            self._set_entries(room_id, set())
+
+    def start_journal(self):
+        """Record changes from now on, for replay onto an index being rebuilt"""
+        with self._lock:
+            if self._journal is None:
+                self._journal = []
+
+    def stop_journal(self):
+        with self._lock:
+            self._journal = None
+
+    def replace(self, other: "PrefixIndex"):
+        """Swap in other's contents, then replay the changes journaled since start_journal()"""
+        with self._lock:
+            journal, self._journal = self._journal or [], None
+            self._keys = other._keys
+            self._rooms_by_entry = other._rooms_by_entry
+            self._entries_by_room = other._entries_by_room
+            for room_id, entries in journal:
+                self._set_entries(room_id, entries)
+
+    def search(self, query: str, limit: int = 8) -> List[dict]:
+        prefix = normalize(query)
+        if not prefix:
+            return []
+        matches = {}
+        with self._lock:
+            for kind in sorted(KIND_RANK, key=KIND_RANK.get):
+                if len(matches) >= limit:
+                    break  # lower-ranked kinds could not make the cut
+                keys = self._keys[kind]
+                position = bisect_left(keys, (prefix,))
+                for key, value in keys[position:position + MAX_SCAN]:
+                    if not key.startswith(prefix):
+                        break
+                    if (kind, value) not in matches:
+                        matches[(kind, value)] = sorted(self._rooms_by_entry[(kind, value)])
+
+        ranked = sorted(
+            matches.items(),
+            key=lambda item: (KIND_RANK[item[0][0]], -len(item[1]), len(item[0][1]), item[0][1])
+        )
+        suggestions = []
+        for (kind, value), room_ids in ranked[:limit]:
+            metadata = {"room_count": len(room_ids)}
+            if kind == "title":
+                metadata["room_id"] = room_ids[0]
+            display = value.replace("_", " ").title() if kind == "property" else value
+            suggestions.append({"type": kind, "value": value, "display_text": display, "metadata": metadata})
+        return suggestions
+
+index = PrefixIndex()
+
+def rebuild(db: Session):
+    """Build a fresh index from the rooms table and swap it in"""
+    index.start_journal()
+    try:
+        rooms = db.query(
+            models.Room.id, models.Room.title, models.Room.location,
+            models.Room.property_type, models.Room.is_deleted
+        ).filter(models.Room.is_deleted == False)
+        fresh = PrefixIndex.build(rooms)
+    except Exception:
+        index.stop_journal()
+        raise
+    index.replace(fresh)
@@ -0,0 +1,87 @@
+"""
+Benchmark a 365-day x 50-room calendar update.
+Creates --rooms throwaway rooms as an admin (their host), then times
+  bulk:     one POST /api/availability/bulk covering every room and day
+  per-room: one POST /api/availability/room/{id}/block-dates per room
+and soft-deletes the rooms afterwards.
+
+Run it against a live server with an admin account (see create_admin.py):
+    BENCH_ADMIN_EMAIL=... BENCH_ADMIN_PASSWORD=... python bench_calendar.py
+
+Needs httpx (pip install httpx); it is not an application dependency.
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+
+import httpx
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+ADMIN_EMAIL = os.environ.get("BENCH_ADMIN_EMAIL")
+ADMIN_PASSWORD = os.environ.get("BENCH_ADMIN_PASSWORD")
+
+def timed(label, fn):
+    began = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - began
+    print(f"{label:<10}{elapsed * 1000:>12.0f} ms")
+    return elapsed
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rooms", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(2031, 1, 1))
+    args = parser.parse_args()
+    if not ADMIN_EMAIL or not ADMIN_PASSWORD:
+        sys.exit("Usage: BENCH_ADMIN_EMAIL=... BENCH_ADMIN_PASSWORD=... python bench_calendar.py [--rooms N] [--days N] [--start YYYY-MM-DD]")
+    end = args.start + timedelta(days=args.days - 1)
+
+    with httpx.Client(base_url=BASE_URL, timeout=600) as http:
+        login = http.post("/auth/login", data={"username": ADMIN_EMAIL, "password": ADMIN_PASSWORD})
+        login.raise_for_status()
+        http.headers["Authorization"] = f"Bearer {login.json()['access_token']}"
+
+        room_ids = []
+        for number in range(args.rooms):
+            response = http.post("/rooms/", data={"title": f"Calendar bench {number}", "price": "100"})
+            response.raise_for_status()
+            room_ids.append(response.json()["id"])
+
+        print(f"{args.days} days x {args.rooms} rooms = {args.days * args.rooms} room-days")
+        try:
+            def bulk():
+                response = http.post("/api/availability/bulk", json={
+                    "room_ids": room_ids,
+                    "changes": [{
+                        "start_date": args.start.isoformat(),
+                        "end_date": end.isoformat(),
+                        "is_available": False,
+                        "price_override": 120,
+                        "notes": "bench",
+                    }],
+                })
+                response.raise_for_status()
+
+            def per_room():
+                for room_id in room_ids:
+                    response = http.post(
+                        f"/api/availability/room/{room_id}/block-dates",
+                        params={"start_date": args.start.isoformat(), "end_date": end.isoformat(), "notes": "bench"},
+                    )
+                    response.raise_for_status()
+
+            # Endpoints missing from older builds are reported and skipped
+            for label, fn in (("bulk", bulk), ("per-room", per_room)):
+                try:
+                    timed(label, fn)
+                except httpx.HTTPStatusError as e:
+                    print(f"{label:<10}{'n/a':>12} ({e.response.status_code})")
+        finally:
+            for room_id in room_ids:
+                http.delete(f"/rooms/{room_id}")
+
+if __name__ == "__main__":
+    main()
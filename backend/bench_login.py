@@ -0,0 +1,87 @@
+"""
+Login throughput benchmark, and what a login burst does to room search.
+Measures GET /rooms/ latency on its own, then again while --logins clients
+hammer POST /auth/login, and reports login req/s and 503 (backpressure) counts.
+
+Run it against a live server:
+    uvicorn app.main:app --workers 1
+    python bench_login.py --logins 50 --searchers 10 --seconds 15
+
+Needs httpx (pip install httpx); it is not an application dependency.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+EMAIL = os.getenv("BENCH_EMAIL", "bench.login@example.com")
+PASSWORD = os.getenv("BENCH_PASSWORD", "BenchPassw0rd!")
+
+SEARCH_PATH = "/rooms/?limit=20&sort=price_asc"
+
+def percentile(samples, fraction):
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(len(samples) * fraction))] * 1000
+
+async def searcher(http, deadline, latencies):
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        response = await http.get(SEARCH_PATH)
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - began)
+
+async def login_client(http, deadline, latencies, statuses):
+    form = {"username": EMAIL, "password": PASSWORD}
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        response = await http.post("/auth/login", data=form)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - began)
+        elif response.status_code == 503:
+            await asyncio.sleep(float(response.headers.get("Retry-After", 1)))
+
+async def phase(logins, searchers, seconds):
+    limits = httpx.Limits(max_connections=logins + searchers, max_keepalive_connections=logins + searchers)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=60) as http:
+        search_latencies, login_latencies, statuses = [], [], {}
+        deadline = time.perf_counter() + seconds
+        began = time.perf_counter()
+        await asyncio.gather(
+            *(searcher(http, deadline, search_latencies) for _ in range(searchers)),
+            *(login_client(http, deadline, login_latencies, statuses) for _ in range(logins)),
+        )
+        elapsed = time.perf_counter() - began
+    return search_latencies, login_latencies, statuses, elapsed
+
+async def ensure_user():
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=60) as http:
+        response = await http.post("/auth/register", json={"email": EMAIL, "password": PASSWORD, "full_name": "Bench"})
+        if response.status_code not in (200, 400):
+            raise SystemExit(f"Could not register {EMAIL}: {response.status_code} {response.text}")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--logins", type=int, default=50)
+    parser.add_argument("--searchers", type=int, default=10)
+    parser.add_argument("--seconds", type=float, default=15)
+    args = parser.parse_args()
+
+    asyncio.run(ensure_user())
+
+    print(f"{'phase':<16}{'search req/s':>14}{'p50 ms':>10}{'p99 ms':>10}{'login req/s':>13}{'login p99':>11}{'503s':>7}")
+    for name, logins in (("search only", 0), ("search + login", args.logins)):
+        searches, logins_ok, statuses, elapsed = asyncio.run(phase(logins, args.searchers, args.seconds))
+        print(
+            f"{name:<16}{len(searches) / elapsed:>14.0f}{percentile(searches, 0.5):>10.1f}"
+            f"{percentile(searches, 0.99):>10.1f}{len(logins_ok) / elapsed:>13.1f}"
+            f"{percentile(logins_ok, 0.99):>11.1f}{statuses.get(503, 0):>7}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Load benchmark for the read-heavy public endpoints
+(GET /rooms/, /rooms/{id}, /api/reviews/room/{id}, /api/availability/room/{id}).
+Reports requests/second and p50/p99 latency at a given concurrency.
+
+Run it against a live server, once per build you want to compare:
+    uvicorn app.main:app --workers 1
+    python bench_read_endpoints.py --concurrency 300 --seconds 20
+
+Needs httpx (pip install httpx); it is not an application dependency.
+"""
+import argparse
+import asyncio
+import os
+import time
+
+import httpx
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+
+def endpoints(room_id):
+    return {
+        "rooms": "/rooms/?limit=20",
+        "room": f"/rooms/{room_id}",
+        "reviews": f"/api/reviews/room/{room_id}",
+        "availability": f"/api/availability/room/{room_id}?start_date=2030-01-01&end_date=2030-01-31",
+    }
+
+async def client(http, path, deadline, latencies, errors):
+    while time.perf_counter() < deadline:
+        began = time.perf_counter()
+        try:
+            response = await http.get(path)
+            if response.status_code != 200:
+                errors.append(response.status_code)
+                continue
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+            continue
+        latencies.append(time.perf_counter() - began)
+
+async def run(path, concurrency, seconds):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=BASE_URL, limits=limits, timeout=60) as http:
+        latencies, errors = [], []
+        deadline = time.perf_counter() + seconds
+        began = time.perf_counter()
+        await asyncio.gather(*(client(http, path, deadline, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - began
+    latencies.sort()
+    if not latencies:
+        return len(errors), 0.0, 0.0, 0.0
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000
+    return len(errors), len(latencies) / elapsed, p50, p99
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=300)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--room-id", type=int, default=1)
+    parser.add_argument("--only", choices=list(endpoints(1)), default=None)
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<14}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for name, path in endpoints(args.room_id).items():
+        if args.only and name != args.only:
+            continue
+        errors, rate, p50, p99 = asyncio.run(run(path, args.concurrency, args.seconds))
+        print(f"{name:<14}{rate:>10.0f}{p50:>10.1f}{p99:>10.1f}{errors:>8}")
+
+if __name__ == "__main__":
+    main()
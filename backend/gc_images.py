@@ -0,0 +1,71 @@
+"""
+Garbage-collect room images.
+Deletes content-addressed files (originals and variants) whose StoredImage has
+had no references for longer than gallery.GRACE_PERIOD, content-addressed
+files with no StoredImage row at all, and abandoned partial uploads.
+Legacy uuid-named uploads are left alone.
+
+    python gc_images.py --dry-run
+    python gc_images.py --recount   # rebuild reference counts from rooms first
+"""
+import argparse
+import os
+import time
+from app.database import SessionLocal, engine, Base
+from app import models, images, gallery
+
+def remove(path, dry_run):
+    if dry_run:
+        print(f"  would remove {path}")
+        return 0
+    try:
+        size = os.path.getsize(path)
+        os.remove(path)
+        return size
+    except FileNotFoundError:
+        return 0
+
+def collect(dry_run=False, recount=False):
+    Base.metadata.create_all(bind=engine, tables=[models.StoredImage.__table__])
+    db = SessionLocal()
+    freed = files = 0
+    try:
+        if recount:
+            gallery.recount_all(db)
+            db.commit()
+            print("✓ Recounted image references")
+
+        # Unreferenced rows: delete the row (only if still unreferenced), remove its
+        # files, then commit; an upload of the same image waits on the deleted row
+        for stored in gallery.collectable(db):
+            if not dry_run and not gallery.forget(db, stored):
+                db.rollback()
+                continue
+            for path in images.stored_files(stored.digest, stored.extension):
+                freed += remove(path, dry_run)
+                files += 1
+            if not dry_run:
+                db.commit()
+
+        # Files without a row and stale partial uploads
+        known = {digest for (digest,) in db.query(models.StoredImage.digest)}
+        cutoff = time.time() - gallery.GRACE_PERIOD.total_seconds()
+        for name in os.listdir(images.IMAGEDIR) if os.path.isdir(images.IMAGEDIR) else []:
+            path = os.path.join(images.IMAGEDIR, name)
+            match = images.CONTENT_NAME.match(name)
+            orphan = (match and match[1] not in known) or name.endswith(".part")
+            if orphan and os.path.getmtime(path) < cutoff:
+                freed += remove(path, dry_run)
+                files += 1
+    finally:
+        db.close()
+
+    action = "Would remove" if dry_run else "Removed"
+    print(f"✓ {action} {files} image files ({freed / (1024 * 1024):.1f} MB freed)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--recount", action="store_true")
+    args = parser.parse_args()
+    collect(dry_run=args.dry_run, recount=args.recount)
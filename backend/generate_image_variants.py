@@ -0,0 +1,101 @@
+"""
+Pre-generate image variants for everything already in static/images, so the
+image route (GET /images/<name>) can serve WebP/AVIF without encoding on
+request. For each original it writes the missing sized variants
+(<stem>_<variant>.webp/.jpg, plus .avif with --avif) and full-size WebP/AVIF
+siblings (<stem>.webp / <stem>.avif). Existing files are never rewritten, so
+it is safe to re-run.
+
+    python generate_image_variants.py --avif --workers 4
+    python generate_image_variants.py --rewrite-urls   # point rooms at /images/
+
+--rewrite-urls moves room image URLs from the /static mount to /images/ and
+fills thumbnail_url from the generated card variant.
+"""
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from app import images
+
+ORIGINAL_EXTENSIONS = ("jpg", "jpeg", "png", "webp")
+
+def is_original(name: str) -> bool:
+    stem, _, extension = name.rpartition(".")
+    if extension not in ORIGINAL_EXTENSIONS or not stem:
+        return False
+    if any(stem.endswith(f"_{variant}") for variant in images.VARIANTS):
+        return False
+    if extension == "webp":
+        # A full-size sibling of a JPEG/PNG original, not an upload
+        return not any(os.path.exists(os.path.join(images.IMAGEDIR, f"{stem}.{ext}")) for ext in ("jpg", "jpeg", "png"))
+    return True
+
+def process(name: str, formats, siblings: bool):
+    path = os.path.join(images.IMAGEDIR, name)
+    try:
+        written = images.make_variants(path, formats=formats, skip_existing=True)
+        if siblings:
+            missing = [sibling for sibling in images.sibling_paths(path) if sibling.rsplit(".", 1)[1] in formats and not os.path.exists(sibling)]
+            if missing:
+                image = images.open_image(path)
+                for sibling in missing:
+                    images.save_as(image, sibling, sibling.rsplit(".", 1)[1])
+                    written += 1
+        return name, written, None
+    except Exception as e:
+        return name, 0, str(e)
+
+def rewrite_urls():
+    from app.database import SessionLocal
+    from app import models
+
+    def moved(url):
+        if url and url.startswith(images.STATIC_URL_PREFIX):
+            return images.URL_PREFIX + url[len(images.STATIC_URL_PREFIX):]
+        return url
+
+    db = SessionLocal()
+    try:
+        changed = 0
+        for room in db.query(models.Room):
+            image_url, gallery = moved(room.image_url), [moved(url) for url in room.images or []]
+            thumbnail_url = room.thumbnail_url
+            if image_url and not thumbnail_url:
+                original_path = os.path.join(images.IMAGEDIR, image_url.rsplit("/", 1)[1])
+                card = images.variant_path(original_path, images.THUMBNAIL_VARIANT, "jpg")
+                if os.path.exists(card):
+                    thumbnail_url = images.to_url(card)
+            if (image_url, gallery, thumbnail_url) != (room.image_url, room.images or [], room.thumbnail_url):
+                room.image_url, room.images, room.thumbnail_url = image_url, gallery, thumbnail_url
+                changed += 1
+        db.commit()
+        print(f"✓ Rewrote image URLs of {changed} rooms")
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--avif", action="store_true", help="also write AVIF (slow to encode)")
+    parser.add_argument("--no-siblings", action="store_true", help="skip full-size WebP/AVIF copies")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--rewrite-urls", action="store_true")
+    args = parser.parse_args()
+
+    formats = images.VARIANT_FORMATS + (images.OFFLINE_FORMATS if args.avif else ())
+    names = sorted(name for name in os.listdir(images.IMAGEDIR) if is_original(name))
+    print(f"Generating variants for {len(names)} images...")
+    total = failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        jobs = pool.map(process, names, [formats] * len(names), [not args.no_siblings] * len(names))
+        for name, written, error in jobs:
+            if error:
+                failed += 1
+                print(f"  ✗ {name}: {error}")
+            total += written
+    print(f"✓ Wrote {total} files ({failed} images failed)")
+
+    if args.rewrite_urls:
+        rewrite_urls()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Concurrency load test for POST /bookings/
+Fires many parallel bookings for the same room and dates and checks that exactly
+one succeeds (the rest get 409), then books many unrelated rooms in parallel to
+show reservations for different rooms are not serialized behind each other.
+
+Run against a live server that uses the same DATABASE_URL as this script:
+    uvicorn app.main:app --workers 4
+    python load_test_bookings.py --requests 300
+
+Use --workers 4 with PostgreSQL only. On SQLite, reservations are serialized
+by in-process locks (see inventory.rooms_lock), so run a single worker:
+    uvicorn app.main:app --workers 1
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import requests
+
+from app.database import SessionLocal, engine, Base
+from app import models, auth
+
+BASE_URL = os.getenv("BASE_URL", "http://localhost:8000")
+
+def setup(room_count):
+    """Create a throwaway guest and rooms directly in the database"""
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        email = f"loadtest_{uuid.uuid4().hex[:8]}@example.com"
+        user = models.User(email=email, full_name="Load Test", hashed_password="!", role="user")
+        db.add(user)
+        rooms = [models.Room(title=f"Load test room {i}", price=100.0) for i in range(room_count)]
+        db.add_all(rooms)
+        db.commit()
+        token = auth.create_access_token(data={"sub": email, "role": "user"})
+        return token, [room.id for room in rooms]
+    finally:
+        db.close()
+
+def book(session, token, room_id, start):
+    response = session.post(
+        f"{BASE_URL}/bookings/",
+        json={
+            "room_id": room_id,
+            "start_date": start.isoformat(),
+            "end_date": (start + timedelta(days=3)).isoformat(),
+            "guests": 1,
+            "payment_method": "pay_on_site",
+        },
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    return response.status_code
+
+def fire(token, room_ids, start, workers):
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=workers, pool_maxsize=workers)
+    session.mount("http://", adapter)
+    began = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        statuses = list(pool.map(lambda room_id: book(session, token, room_id, start), room_ids))
+    return Counter(statuses), time.perf_counter() - began
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=100)
+    args = parser.parse_args()
+
+    token, room_ids = setup(args.requests + 1)
+    start = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0) + timedelta(days=30)
+    failures = []
+
+    # 1. Everyone races for the same room and dates
+    contested = [room_ids[0]] * args.requests
+    statuses, elapsed = fire(token, contested, start, args.workers)
+    print(f"Same room:      {dict(statuses)} in {elapsed:.2f}s ({args.requests / elapsed:.0f} req/s)")
+    if statuses.get(200) != 1 or statuses.get(409) != args.requests - 1:
+        failures.append("expected exactly one 200 and the rest 409 for the contested room")
+
+    # 2. Same load spread over unrelated rooms: every booking should succeed
+    spread = room_ids[1:]
+    statuses, spread_elapsed = fire(token, spread, start, args.workers)
+    print(f"Distinct rooms: {dict(statuses)} in {spread_elapsed:.2f}s ({len(spread) / spread_elapsed:.0f} req/s)")
+    if statuses.get(200) != len(spread):
+        failures.append("expected every booking on distinct rooms to succeed")
+
+    # 3. Serial baseline for comparison
+    sample = room_ids[1:21]
+    serial_start = start + timedelta(days=10)
+    statuses, serial_elapsed = fire(token, sample, serial_start, 1)
+    serial_rate = len(sample) / serial_elapsed
+    print(f"Serial baseline: {serial_rate:.0f} req/s; parallel speedup on distinct rooms: "
+          f"{(len(spread) / spread_elapsed) / serial_rate:.1f}x")
+
+    if failures:
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1)
+    print("PASS")
+
+if __name__ == "__main__":
+    main()
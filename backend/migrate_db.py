@@ -1,8 +1,10 @@
 """
 Database migration script to add latitude and longitude columns to rooms table
+and backfill derived tables for existing rows
 """
-from sqlalchemy import text
-from app.database import engine
+from sqlalchemy import Boolean, Date, Float, Integer, Text, column, func, inspect, select, table, text
+from app.database import engine, SessionLocal, Base
+from app import models, crud, fulltext, host_calendar, analytics, inventory
 
 def add_missing_columns():
     with engine.connect() as conn:
@@ -28,7 +30,219 @@ def add_missing_columns():
         except Exception as e:
             print(f"Error adding longitude: {e}")
 
+def run_statements(statements):
+    """Run each DDL statement in its own transaction, reporting failures"""
+    with engine.connect() as conn:
+        for statement in statements:
+            try:
+                conn.execute(text(statement))
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"Error running '{statement}': {e}")
+
+def add_listing_sort_columns():
+    """Rating columns and composite indexes backing keyset pagination on /rooms/"""
+    statements = [
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS average_rating FLOAT NOT NULL DEFAULT 0",
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS review_count INTEGER NOT NULL DEFAULT 0",
+        "CREATE INDEX IF NOT EXISTS ix_rooms_listing_price ON rooms (is_deleted, price, id)",
+        "CREATE INDEX IF NOT EXISTS ix_rooms_listing_rating ON rooms (is_deleted, average_rating, id)",
+    ]
+    run_statements(statements)
+    print("✓ Added listing sort columns and indexes")
+
+def add_pricing_columns():
+    """Long-stay discount rules used by the price engine"""
+    statements = [
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS weekly_discount FLOAT",
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS monthly_discount FLOAT",
+    ]
+    run_statements(statements)
+    print("✓ Added pricing columns")
+
+def add_thumbnail_column():
+    """Listing-card thumbnail generated from uploads (see app/images.py)"""
+    statements = [
+        "ALTER TABLE rooms ADD COLUMN IF NOT EXISTS thumbnail_url VARCHAR",
+    ]
+    run_statements(statements)
+    print("✓ Added thumbnail column")
+
+def add_booking_rates_column():
+    """Per-night rates of each booking, repriced incrementally on modification"""
+    statements = [
+        "ALTER TABLE bookings ADD COLUMN IF NOT EXISTS nightly_rates JSON",
+    ]
+    run_statements(statements)
+    print("✓ Added booking nightly rates column")
+
+def add_availability_indexes():
+    """Indexes backing date-range availability search and booking lists"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_bookings_room_dates ON bookings (room_id, start_date, end_date)",
+        "CREATE INDEX IF NOT EXISTS ix_bookings_user_start ON bookings (user_id, start_date)",
+    ]
+    run_statements(statements)
+    print("✓ Added availability indexes")
+
+def add_availability_unique_index():
+    """One calendar row per room and day (required by the bulk calendar upserts);
+    duplicate rows keep the most recent one"""
+    if not inspect(engine).has_table("room_availability"):
+        return
+    statements = [
+        "DELETE FROM room_availability WHERE id NOT IN "
+        "(SELECT MAX(id) FROM room_availability GROUP BY room_id, date)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS uq_room_availability_room_date ON room_availability (room_id, date)",
+        "DROP INDEX IF EXISTS ix_room_availability_room_date",
+    ]
+    run_statements(statements)
+    print("✓ Added unique calendar index")
+
+# Per-day calendar table replaced by room_availability_ranges
+per_day_availability = table(
+    "room_availability",
+    column("id", Integer),
+    column("room_id", Integer),
+    column("date", Date),
+    column("is_available", Boolean),
+    column("price_override", Float),
+    column("notes", Text),
+)
+
+def migrate_availability_to_ranges():
+    """Run-length encode the per-day room_availability rows into
+    room_availability_ranges, one room at a time. Ranges hosts have written
+    since (the app creates the table at startup) win over the legacy days they
+    cover; the rest of the legacy calendar is laid under them, so re-running is
+    harmless. room_availability is left in place and can be dropped afterwards."""
+    Base.metadata.create_all(bind=engine, tables=[models.RoomAvailabilityRange.__table__])
+    if not inspect(engine).has_table("room_availability"):
+        print("- No per-day calendar to migrate")
+        return
+    db = SessionLocal()
+    try:
+        room_ids = db.execute(
+            select(per_day_availability.c.room_id).where(per_day_availability.c.room_id.isnot(None)).distinct()
+        ).scalars().all()
+        days = ranges = 0
+        for room_id in room_ids:
+            rows = db.execute(
+                select(
+                    per_day_availability.c.room_id,
+                    per_day_availability.c.date,
+                    per_day_availability.c.is_available,
+                    per_day_availability.c.price_override,
+                    per_day_availability.c.notes
+                ).where(per_day_availability.c.room_id == room_id).order_by(
+                    per_day_availability.c.date, per_day_availability.c.id.desc()
+                )
+            ).all()
+            segments = [segment for _, segment in host_calendar.compress(rows)]
+            with inventory.rooms_lock(db, [room_id]):
+                ranges += host_calendar.underlay(db, room_id, segments)
+                db.commit()
+            days += len(rows)
+        print(f"✓ Merged {days} legacy calendar days into room_availability_ranges ({ranges} ranges written)")
+    except Exception as e:
+        db.rollback()
+        print(f"Error migrating calendar to ranges: {e}")
+    finally:
+        db.close()
+
+def add_review_indexes():
+    """Indexes backing sorted, keyset-paginated review listings"""
+    statements = [
+        "CREATE INDEX IF NOT EXISTS ix_reviews_room_approved_created ON reviews (room_id, is_approved, created_at)",
+        "CREATE INDEX IF NOT EXISTS ix_reviews_room_approved_rating ON reviews (room_id, is_approved, rating)",
+    ]
+    run_statements(statements)
+    print("✓ Added review indexes")
+
+def add_booking_overlap_constraint():
+    """PostgreSQL only: reject overlapping non-cancelled bookings at the database level"""
+    if engine.dialect.name != "postgresql":
+        print("- Skipping booking exclusion constraint (PostgreSQL only)")
+        return
+    statements = [
+        "CREATE EXTENSION IF NOT EXISTS btree_gist",
+        """
+        ALTER TABLE bookings ADD CONSTRAINT bookings_no_overlap
+        EXCLUDE USING gist (
+            room_id WITH =,
+            daterange(start_date::date, end_date::date) WITH &&
+        ) WHERE (status <> 'cancelled')
+        """,
+    ]
+    run_statements(statements)
+    print("✓ Added booking overlap exclusion constraint")
+
+def add_geohash_column():
+    """Geohash grid column backing map search"""
+    statements = [
+        'ALTER TABLE rooms ADD COLUMN IF NOT EXISTS geohash VARCHAR(12) COLLATE "C"',
+        "CREATE INDEX IF NOT EXISTS ix_rooms_geohash ON rooms (geohash)",
+    ]
+    run_statements(statements)
+    print("✓ Added geohash column")
+
+def add_fulltext_index():
+    """tsvector GIN index (PostgreSQL) or FTS5 table + triggers (SQLite) for room search"""
+    try:
+        fulltext.ensure_index(engine)
+        print("✓ Added full-text index")
+    except Exception as e:
+        print(f"Error adding full-text index: {e}")
+
+def backfill_room_indexes():
+    """Populate the room_features index and geohashes for existing rooms"""
+    Base.metadata.create_all(bind=engine, tables=[models.RoomFeature.__table__])
+    db = SessionLocal()
+    try:
+        rooms = db.query(models.Room).all()
+        for room in rooms:
+            crud.sync_room_features(db, room)
+            crud.sync_room_geohash(room)
+        db.commit()
+        print(f"✓ Indexed features and geohashes for {len(rooms)} rooms")
+    except Exception as e:
+        db.rollback()
+        print(f"Error backfilling room indexes: {e}")
+    finally:
+        db.close()
+
+def backfill_booking_stats():
+    """Daily analytics rollups for existing bookings; later bookings keep them current"""
+    Base.metadata.create_all(bind=engine, tables=[models.RoomDailyStats.__table__])
+    db = SessionLocal()
+    try:
+        if db.execute(select(func.count()).select_from(models.RoomDailyStats)).scalar():
+            print("- Analytics rollups already present, skipping")
+            return
+        bookings = analytics.rebuild(db)
+        print(f"✓ Rolled up {bookings} bookings into daily analytics")
+    except Exception as e:
+        db.rollback()
+        print(f"Error backfilling analytics rollups: {e}")
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     print("Adding missing columns to rooms table...")
     add_missing_columns()
+    add_listing_sort_columns()
+    add_availability_indexes()
+    add_pricing_columns()
+    add_review_indexes()
+    add_geohash_column()
+    add_fulltext_index()
+    add_booking_overlap_constraint()
+    add_thumbnail_column()
+    add_availability_unique_index()
+    migrate_availability_to_ranges()
+    add_booking_rates_column()
+    print("Backfilling derived tables...")
+    backfill_room_indexes()
+    backfill_booking_stats()
     print("Migration complete!")
@@ -0,0 +1,22 @@
+"""
+Rebuild the daily analytics rollups (room_daily_stats) from the bookings table.
+Use after bulk imports, direct edits to bookings, or if the rollups drift.
+"""
+from app.database import SessionLocal, engine, Base
+from app import models, analytics
+
+def rebuild_analytics():
+    Base.metadata.create_all(bind=engine, tables=[models.RoomDailyStats.__table__])
+    db = SessionLocal()
+    try:
+        bookings = analytics.rebuild(db)
+        days = db.query(models.RoomDailyStats).count()
+        print(f"✓ Rebuilt analytics rollups from {bookings} bookings ({days} room-days)")
+    except Exception as e:
+        db.rollback()
+        print(f"Error rebuilding analytics: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    rebuild_analytics()
@@ -0,0 +1,22 @@
+"""
+Rebuild per-room rating histograms and Room.average_rating / review_count
+from the reviews table. Use after bulk imports or if aggregates drift.
+"""
+from app.database import SessionLocal, engine, Base
+from app import models, ratings
+
+def recompute_ratings():
+    Base.metadata.create_all(bind=engine, tables=[models.RoomRatingStats.__table__])
+    db = SessionLocal()
+    try:
+        ratings.recompute_all(db)
+        rated = db.query(models.Room).filter(models.Room.review_count > 0).count()
+        print(f"✓ Recomputed rating aggregates ({rated} rooms with approved reviews)")
+    except Exception as e:
+        db.rollback()
+        print(f"Error recomputing ratings: {e}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    recompute_ratings()